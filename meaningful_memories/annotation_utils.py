@@ -4,7 +4,8 @@ import re
 import uuid
 
 from meaningful_memories import here
-from meaningful_memories.utils import get_adamlink_coordinates
+from meaningful_memories.transcript_index import TranscriptIndex
+from meaningful_memories.utils import get_adamlink_coordinates_many
 
 def get_non_truncated_context(text, start, end, min_context_len=30):
     exact = text[start:end]
@@ -26,22 +27,68 @@ def get_non_truncated_context(text, start, end, min_context_len=30):
     return prefix, exact, suffix
 
 
+class VideoCatalogue:
+    """Index of the video catalogue by identifier stem (the identifier up to its first dot).
+
+    The index is built on first use and rebuilt only when the size or
+    modification time of the catalogue file changes. When several videos
+    share a stem, the first one in the file is used.
+    """
+
+    def __init__(self, path=os.path.join(here, "annotation_data/amsterdammuseum_uva_videos.json")):
+        self.path = path
+        self.signature = None
+        self.index = {}
+
+    def refresh(self):
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self.signature:
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = {}
+        for item in data:
+            identifier = item.get("identifier")
+            if identifier:
+                index.setdefault(
+                    identifier.split(".")[0],
+                    (item.get("name"), identifier, item.get("@id")),
+                )
+        self.index, self.signature = index, signature
+
+    def look_up(self, str_identifier):
+        return self.look_up_many([str_identifier])[str_identifier]
+
+    def look_up_many(self, str_identifiers):
+        """Map each identifier stem to (name, identifier, video uri), empty strings when unknown."""
+        self.refresh()
+        return {
+            str_identifier: self.index.get(str_identifier, ("", "", ""))
+            for str_identifier in str_identifiers
+        }
+
+
+video_catalogue = VideoCatalogue()
+
+
 def look_up_uri(str_identifier):
-    with open(
-        os.path.join(here, "annotation_data/amsterdammuseum_uva_videos.json"),
-        "r",
-        encoding="utf-8",
-    ) as f:
-        data = json.load(f)
-    for item in data:
-        if item.get("identifier").split(".")[0] == str_identifier:
-            return item.get("name"), item.get("identifier"), item.get("@id")
-    return "", "", ""
+    return video_catalogue.look_up(str_identifier)
+
+
+def look_up_uris(str_identifiers):
+    return video_catalogue.look_up_many(str_identifiers)
 
 
 def generate_web_annotations(data, original_uri: str = "", text_only=False):
     w3_annotations = []
     name, identifier, video_id = look_up_uri(original_uri)
+    index = None
+    coordinates = get_adamlink_coordinates_many(
+        ent.get("adamlink") or ent.get("metadata", {}).get("adamlink")
+        for ent in data["entities"]
+        if ent.get("adamlink") or ent.get("metadata", {}).get("adamlink")
+    )
     for ent in data["entities"]:
         body = [
             {"type": "TextualBody", "value": ent["label"], "purpose": "classifying"}
@@ -61,7 +108,7 @@ def generate_web_annotations(data, original_uri: str = "", text_only=False):
                         },
                     }
                 if datalink == "adamlink":
-                    long, lat = get_adamlink_coordinates(datalink_value)
+                    long, lat = coordinates[datalink_value]
                     resource["source"]["longitude"] = long
                     resource["source"]["latitude"] = lat
                 body.append(resource)
@@ -69,6 +116,12 @@ def generate_web_annotations(data, original_uri: str = "", text_only=False):
         start = ent["global_start"]
         end = ent["global_end"]
         full_text = data["data"]["text"]
+        timestamps = ent.get("timestamps")
+        if not timestamps:
+            # entities added in Label Studio only have offsets; built on first need
+            if index is None:
+                index = TranscriptIndex(data.get("transcript_chunks", []))
+            timestamps = index.locate(start)["timestamp"]
 
         prefix, exact, suffix = get_non_truncated_context(full_text, start, end)
         selector = [
@@ -80,13 +133,15 @@ def generate_web_annotations(data, original_uri: str = "", text_only=False):
             }
         ]
         if not text_only:
-            selector.append(
-                {
-                    "type": "FragmentSelector",
-                    "conformsTo": "http://www.w3.org/TR/media-frags/",
-                    "values": f"t={ent['timestamps'][0]},{ent['timestamps'][1]}",
-                }
-            )
+            # without a timestamp (offset outside the chunks) only the text is selected
+            if timestamps:
+                selector.append(
+                    {
+                        "type": "FragmentSelector",
+                        "conformsTo": "http://www.w3.org/TR/media-frags/",
+                        "values": f"t={timestamps[0]},{timestamps[1]}",
+                    }
+                )
             source = {"@context": "https://schema.org",
         "id": video_id,
         "type": "VideoObject",
@@ -0,0 +1,92 @@
+import gc
+import logging
+
+import torch
+
+GIB = 1024**3
+
+
+def is_out_of_memory(error: Exception):
+    if isinstance(error, torch.cuda.OutOfMemoryError):
+        return True
+    # CTranslate2 (faster-whisper) reports CUDA OOM as a plain RuntimeError
+    return isinstance(error, RuntimeError) and "out of memory" in str(error).lower()
+
+
+def free_device_memory():
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def discover_batch_size(device, item_gb, maximum, cpu_default):
+    """Largest power of two batch that fits in the free device memory, given the memory one item needs."""
+    if not str(device).startswith("cuda") or not torch.cuda.is_available():
+        return cpu_default
+    free_bytes, _ = torch.cuda.mem_get_info()
+    fitting = int(0.8 * free_bytes / (item_gb * GIB))
+    size = 1
+    while size * 2 <= min(fitting, maximum):
+        size *= 2
+    return size
+
+
+class AdaptiveBatchSize:
+    """Batch size that halves and retries when a batch runs out of memory."""
+
+    def __init__(self, name: str, size: int, config_key: str = "", minimum: int = 1):
+        self.name = name
+        self.size = max(size, minimum)
+        self.minimum = minimum
+        self.config_key = config_key
+        logging.info(f"{self.name} batch size: {self.size}")
+
+    def _back_off(self, error):
+        if not is_out_of_memory(error) or self.size <= self.minimum:
+            return False
+        free_device_memory()
+        self.size = max(self.minimum, self.size // 2)
+        logging.warning(
+            f"{self.name} ran out of memory, retrying with batch size {self.size}"
+            + (f" (pin it with {self.config_key}: {self.size})" if self.config_key else "")
+        )
+        return True
+
+    def run(self, fn):
+        """Call fn(batch_size) until it succeeds without running out of memory."""
+        while True:
+            try:
+                return fn(self.size)
+            except Exception as error:
+                if not self._back_off(error):
+                    raise
+
+    def map(self, fn, items):
+        """Apply fn to consecutive batches of items and return the concatenated results.
+
+        fn receives a list of items and returns one result per item.
+        """
+        results = []
+        start = 0
+        while start < len(items):
+            batch = items[start : start + self.size]
+            try:
+                results.extend(fn(batch))
+            except Exception as error:
+                if not self._back_off(error):
+                    raise
+                continue
+            start += len(batch)
+        return results
+
+    def map_sorted(self, fn, items, key):
+        """Like map, but batches the items in order of key and returns the results in the order of items.
+
+        With key the length of a text, each batch holds texts of similar size,
+        so little of it is padding.
+        """
+        order = sorted(range(len(items)), key=lambda i: key(items[i]))
+        results = [None] * len(items)
+        for i, result in zip(order, self.map(fn, [items[i] for i in order])):
+            results[i] = result
+        return results
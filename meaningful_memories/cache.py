@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from meaningful_memories.config import config
+
+_file_hashes = {}
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file's content, memoized per (path, size, mtime) within the process."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+
+def _json_default(value):
+    # numpy scalars and arrays that end up in model output
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class StageCache:
+    """Content-addressed store for the raw output of expensive pipeline stages.
+
+    Entries are JSON files named after a hash of everything that determines the
+    stage output (input content hash, model name, relevant settings), so a changed
+    input simply maps to a new key and stale entries are never read.
+    """
+
+    def __init__(self, cache_dir=None, enabled=True):
+        self.cache_dir = os.path.expanduser(cache_dir or config.cache.dir)
+        self.enabled = enabled
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def _path(self, stage, key):
+        return os.path.join(self.cache_dir, stage, key[:2], f"{key}.json")
+
+    def get(self, stage, key):
+        if not self.enabled:
+            return None
+        path = self._path(stage, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except json.JSONDecodeError:
+            logging.warning(f"Ignoring corrupt cache entry {path}")
+            return None
+        logging.info(f"Using cached {stage} output {key[:12]}")
+        return data
+
+    def put(self, stage, key, data):
+        if not self.enabled:
+            return
+        path = self._path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=_json_default)
+        os.replace(tmp_path, path)
+
+
+class ResponseCache:
+    """Durable SQLite cache for LLM responses, keyed on a hash of the full request.
+
+    The request holds the model name, the message list and the format schema,
+    so any change to the prompt or model maps to a new entry. When more than
+    max_entries are stored, the least recently read ones are removed. With a
+    ttl (in seconds), entries older than that count as missing.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttl=None):
+        self.path = os.path.expanduser(
+            path or os.path.join(config.cache.dir, "llm_responses.sqlite")
+        )
+        self.max_entries = max_entries or config.llm.cache.max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL, accessed REAL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+        )
+        self.entries = self.connection.execute(
+            "SELECT COUNT(*) FROM responses"
+        ).fetchone()[0]
+
+    @staticmethod
+    def key(request):
+        return hashlib.sha256(
+            json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key):
+        row = self.connection.execute(
+            "SELECT value, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and self.ttl and row[1] < time.time() - self.ttl:
+            with self.connection:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.entries -= 1
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.connection:
+            self.connection.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+        return row[0]
+
+    def put_many(self, items):
+        now = time.time()
+        with self.connection:
+            for key, value in items:
+                inserted = self.connection.execute(
+                    "INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                ).rowcount
+                self.entries += inserted
+            excess = self.entries - self.max_entries
+            if excess > 0:
+                self.connection.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                    (excess,),
+                )
+                self.entries -= excess
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": self.entries}
+
+
+stage_cache = StageCache(enabled=config.cache.enabled)
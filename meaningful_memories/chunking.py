@@ -0,0 +1,218 @@
+import re
+from collections import Counter
+from typing import Dict, List
+
+from meaningful_memories.config import config
+from meaningful_memories.registry import registry
+from meaningful_memories.transcript_chunk import TranscriptChunk
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(unit: Dict) -> List[Dict]:
+    """Split a unit into its sentences, each keeping the timestamps of the unit."""
+    sentences = [s for s in SENTENCE_END.split(unit["text"].strip()) if s]
+    if len(sentences) <= 1:
+        return [unit]
+    return [dict(unit, text=sentence) for sentence in sentences]
+
+
+class Chunker:
+    """Greedily packs transcript units (segments, lines) into chunks of bounded size.
+
+    Every unit's cost is computed once and the running total is kept per chunk,
+    so chunking is linear in the length of the transcript. With overlap > 0
+    the last units of a chunk are repeated at the start of the next one; the
+    repeated prefix is recorded on the chunk so it is not counted twice when
+    the chunks are joined into the full transcript.
+    """
+
+    def __init__(self, budget: float, overlap: int = 0):
+        self.budget = budget
+        self.overlap = overlap
+
+    def prepare(self, unit: Dict) -> List[Dict]:
+        return [unit]
+
+    def cost(self, unit: Dict) -> float:
+        raise NotImplementedError
+
+    def exceeds(self, current: List[Dict], used: float, unit: Dict, cost: float):
+        return used + cost > self.budget
+
+    def breaks(self, previous: Dict, unit: Dict):
+        return False
+
+    def chunk(self, units: List[Dict]) -> List[TranscriptChunk]:
+        chunks = []
+        current, costs, carried = [], [], 0
+        used = 0
+        for raw_unit in units:
+            for unit in self.prepare(raw_unit):
+                if not unit["text"].strip():
+                    continue
+                cost = self.cost(unit)
+                if current and (
+                    self.exceeds(current, used, unit, cost)
+                    or self.breaks(current[-1], unit)
+                ):
+                    chunks.append(self.make_chunk(current, carried, len(chunks)))
+                    carried = (
+                        self.overlap
+                        if self.overlap
+                        and len(current) > self.overlap
+                        and not self.breaks(current[-1], unit)
+                        else 0
+                    )
+                    current = current[len(current) - carried :] if carried else []
+                    costs = costs[len(costs) - carried :] if carried else []
+                    used = sum(costs)
+                    if current and self.exceeds(current, used, unit, cost):
+                        current, costs, carried, used = [], [], 0, 0
+                current.append(unit)
+                costs.append(cost)
+                used += cost
+        if current:
+            chunks.append(self.make_chunk(current, carried, len(chunks)))
+        return chunks
+
+    @staticmethod
+    def make_chunk(units: List[Dict], carried: int, index: int) -> TranscriptChunk:
+        texts = [unit["text"].strip() for unit in units]
+        # the carried units plus the space that follows them
+        overlap = len(" ".join(texts[:carried])) + 1 if carried else 0
+        start = units[0].get("start") or 0
+        end = units[-1].get("end")
+        speakers = Counter(unit.get("speaker") for unit in units)
+        return TranscriptChunk(
+            " ".join(texts),
+            index,
+            start,
+            end if end is not None else start,
+            speaker=speakers.most_common(1)[0][0],
+            overlap=overlap,
+        )
+
+
+class WordChunker(Chunker):
+    def prepare(self, unit):
+        if len(unit["text"].split()) <= self.budget:
+            return [unit]
+        size = int(self.budget)
+        pieces = []
+        for sentence in split_sentences(unit):
+            words = sentence["text"].split()
+            for i in range(0, len(words), size):
+                pieces.append(dict(sentence, text=" ".join(words[i : i + size])))
+        return pieces
+
+    def cost(self, unit):
+        return len(unit["text"].split())
+
+
+class SentenceChunker(WordChunker):
+    """Packs whole sentences up to a word budget."""
+
+    def prepare(self, unit):
+        pieces = []
+        for sentence in split_sentences(unit):
+            pieces.extend(super().prepare(sentence))
+        return pieces
+
+
+class TokenChunker(Chunker):
+    """Packs units up to a number of tokens of the NER model's tokenizer."""
+
+    def __init__(self, budget, overlap=0, tokenizer_name=None):
+        super().__init__(budget, overlap)
+        self.tokenizer_name = tokenizer_name or config.transcript.chunking.tokenizer
+        self._tokenizer = None
+
+    def load_tokenizer(self):
+        def load():
+            from transformers import AutoTokenizer
+
+            return AutoTokenizer.from_pretrained(self.tokenizer_name)
+
+        return registry.get(("tokenizer", self.tokenizer_name), load)
+
+    @property
+    def tokenizer(self):
+        return self._tokenizer or self.load_tokenizer()
+
+    def chunk(self, units):
+        # looked up once per call instead of for every unit's cost; not kept
+        # afterwards, so the registry can still evict it
+        self._tokenizer = self.load_tokenizer()
+        try:
+            return super().chunk(units)
+        finally:
+            self._tokenizer = None
+
+    def prepare(self, unit):
+        if self.cost(unit) <= self.budget:
+            return [unit]
+        return split_sentences(unit)
+
+    def cost(self, unit):
+        return len(self.tokenizer.tokenize(unit["text"]))
+
+
+class DurationChunker(Chunker):
+    """Packs timed segments until a chunk spans more than budget seconds."""
+
+    def cost(self, unit):
+        return float(unit["end"]) - float(unit["start"])
+
+    def exceeds(self, current, used, unit, cost):
+        return float(unit["end"]) - float(current[0]["start"]) > self.budget
+
+
+class SpeakerTurnChunker(DurationChunker):
+    """Like DurationChunker, but also starts a new chunk whenever the speaker changes."""
+
+    def breaks(self, previous, unit):
+        return previous.get("speaker", "unknown") != unit.get("speaker", "unknown")
+
+
+def get_chunker(timed: bool) -> Chunker:
+    settings = config.transcript.chunking
+    strategy = settings.strategy
+    if strategy == "auto":
+        strategy = "duration" if timed else "words"
+    if strategy == "words":
+        return WordChunker(settings.max_words, settings.overlap)
+    if strategy == "sentences":
+        return SentenceChunker(settings.max_words, settings.overlap)
+    if strategy == "tokens":
+        return TokenChunker(settings.max_tokens, settings.overlap)
+    if strategy == "duration":
+        return DurationChunker(settings.max_duration, settings.overlap)
+    if strategy == "speaker":
+        return SpeakerTurnChunker(settings.max_duration, settings.overlap)
+    raise ValueError(f"Unknown chunking strategy: {strategy}")
+
+
+def deduplicate_overlap(entities: List[Dict], chunks: List[TranscriptChunk]):
+    """Drop entities that were found twice because they lie in the overlap of two chunks.
+
+    An entity in the repeated prefix of a chunk is a duplicate when the previous
+    chunk has an entity with the same label at the same position of the shared text.
+    """
+    previous = {
+        chunk.id: prev for prev, chunk in zip(chunks, chunks[1:]) if chunk.overlap
+    }
+    if not previous:
+        return entities
+    found = {(ent["chunk_id"], ent["start"], ent["end"], ent["label"]) for ent in entities}
+    chunks_by_id = {chunk.id: chunk for chunk in chunks}
+    unique = []
+    for ent in entities:
+        prev = previous.get(ent["chunk_id"])
+        chunk = chunks_by_id[ent["chunk_id"]]
+        if prev is not None and ent["start"] < chunk.overlap:
+            shift = len(prev.text) + 1 - chunk.overlap
+            if (prev.id, ent["start"] + shift, ent["end"] + shift, ent["label"]) in found:
+                continue
+        unique.append(ent)
+    return unique
@@ -0,0 +1,96 @@
+from typing import Dict
+
+from meaningful_memories.transcript_chunk import chunk_id, chunk_index
+
+# keys of an entity in the JSON output, in order
+FIELDS = (
+    "start",
+    "end",
+    "text",
+    "label",
+    "score",
+    "chunk_id",
+    "timestamps",
+    "preflabel",
+    "wikidata",
+    "adamlink",
+    "longitude",
+    "latitude",
+    "gtaa_subject",
+    "global_start",
+    "global_end",
+    "line_index",
+    "line_timestamp",
+    "line_text",
+)
+
+# keys stored in slots
+ATTRIBUTES = frozenset(FIELDS) - {"chunk_id"} | {"chunk_index"}
+
+
+class Entity:
+    """One entity mention.
+
+    Slotted instead of a dict, with the chunk stored as its integer index.
+    Supports the dict-style access (ent["label"], ent.get, "key" in ent) of
+    the plain dicts it replaces; "chunk_id" reads and writes the string id.
+    Keys outside FIELDS go to a separate dict. to_dict gives the JSON shape.
+    """
+
+    __slots__ = tuple(sorted(ATTRIBUTES)) + ("extra",)
+
+    def __init__(self, **fields):
+        self.extra = None
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Entity":
+        return cls(**data)
+
+    def __getitem__(self, key):
+        if key == "chunk_id":
+            index = self["chunk_index"]
+            return None if index is None else chunk_id(index)
+        if key in ATTRIBUTES:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "chunk_id":
+            # None for entities that are not in a chunk (e.g. merged annotations)
+            self.chunk_index = None if value is None else chunk_index(value)
+        elif key in ATTRIBUTES:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = [field for field in FIELDS if field in self]
+        return keys + list(self.extra or {})
+
+    def to_dict(self) -> Dict:
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self):
+        return f"Entity({self.to_dict()!r})"
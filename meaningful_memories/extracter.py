@@ -1,14 +1,34 @@
 import logging
-from collections import Counter
-from typing import List
+from collections import Counter, defaultdict
+from typing import List, Optional
 
-from gliner import GLiNER
-from ollama import ChatResponse, chat
+import torch
 from pydantic import BaseModel
 
+from meaningful_memories.batching import AdaptiveBatchSize, discover_batch_size
+from meaningful_memories.chunking import deduplicate_overlap
 from meaningful_memories.config import config
+from meaningful_memories.entity import Entity
 from meaningful_memories.interview import Interview
-from meaningful_memories.linker import LocationLinker, SubjectLinker
+from meaningful_memories.linker import (LocationLinker, SubjectLinker,
+                                        link_entities, set_location_match)
+from meaningful_memories.llm import LLMRequestPool
+from meaningful_memories.registry import registry, size_hint
+
+
+def load_gliner(model_name, device):
+    # imported here, so the LLM extracters work without GLiNER installed
+    from gliner import GLiNER
+
+    return GLiNER.from_pretrained(model_name).to(device)
+
+
+def aggregate_topics(interview):
+    topic_counter = Counter()
+    for chunk_topics in interview.chunk_topics:
+        topic_counter.update([topic.lower() for topic in chunk_topics["topics"]])
+    logging.info(f"Found the following topics: {topic_counter}")
+    interview.topics = topic_counter.most_common(5)
 
 
 class Extracter:
@@ -25,42 +45,91 @@ class Extracter:
 class EntityExtracter(Extracter):
     def __init__(self):
         self.model_name: str = config.entities.model_name
-        self.model = None
-        if not self.model:
-            self.load_model()
+        self.device: str = "cuda" if torch.cuda.is_available() else "cpu"
+        self.load_model()
+        self.batch_sizer = AdaptiveBatchSize(
+            "GLiNER",
+            self.get_batch_size(),
+            config_key="entities.batch_size",
+        )
         self.labels: List[str] = ["Person", "Date", "Location", "Food", "Occupation"]
         self.model_threshold: float = 0.5
         self.post_threshold: float = 0.8
         self.location_linker = LocationLinker()
         self.subject_linker = SubjectLinker()
 
+    @property
+    def model(self):
+        return self.load_model()
+
     def load_model(self):
-        self.model = GLiNER.from_pretrained(self.model_name)
+        return registry.get(
+            ("gliner", self.model_name, self.device),
+            lambda: load_gliner(self.model_name, self.device),
+            device=self.device,
+            size_hint_gb=size_hint("gliner"),
+        )
+
+    def get_batch_size(self):
+        if config.entities.batch_size != "auto":
+            return int(config.entities.batch_size)
+        return discover_batch_size(
+            self.device,
+            config.entities.batch_item_gb,
+            config.entities.max_batch_size,
+            cpu_default=8,
+        )
+
+    def predict(self, chunks):
+        return self.model.batch_predict_entities(
+            [chunk.text for chunk in chunks], self.labels, threshold=self.model_threshold
+        )
 
     def extract(self, interview: Interview):
-        for chunk in interview.transcript.chunks:
-            chunk_entities = self.model.predict_entities(
-                chunk.text, self.labels, threshold=self.model_threshold
-            )
+        self.extract_batch([interview])
+
+    def extract_batch(self, interviews: List[Interview]):
+        """Run GLiNER over the chunks of all interviews at once.
+
+        Chunks are sorted by length so each batch holds texts of similar size
+        (little padding), and the predictions are put back in transcript order.
+        """
+        items = [
+            (interview, chunk)
+            for interview in interviews
+            for chunk in interview.transcript.chunks
+        ]
+        item_entities = self.batch_sizer.map_sorted(
+            self.predict, [chunk for _, chunk in items], key=lambda chunk: len(chunk.text)
+        )
+        found = {id(interview): [] for interview in interviews}
+        for (interview, chunk), chunk_entities in zip(items, item_entities):
             for ent in chunk_entities:
                 if ent["score"] > self.post_threshold:
-                    ent["chunk_id"] = chunk.id
-                    ent["timestamps"] = chunk.timestamp
-                    ent = self.add_location_id(ent)
-                    ent = self.add_subject_id(ent)
-                    interview.entities.append(ent)
+                    found[id(interview)].append(
+                        Entity(
+                            **ent, chunk_index=chunk.index, timestamps=chunk.timestamp
+                        )
+                    )
+        for interview in interviews:
+            found[id(interview)] = deduplicate_overlap(
+                found[id(interview)], interview.transcript.chunks
+            )
+        self.link_entities(
+            [ent for interview in interviews for ent in found[id(interview)]]
+        )
+        for interview in interviews:
+            interview.entities.extend(found[id(interview)])
+
+    def link_entities(self, entities: List[dict]):
+        link_entities(entities, self.location_linker, self.subject_linker)
 
     def add_location_id(self, entity: dict):
         if entity["label"] != "Location":
             return entity
-        preflabel, wikidata, adamlink, longitude, latitude = self.location_linker.find_location_match(
-            entity["text"]
+        set_location_match(
+            entity, self.location_linker.find_location_match(entity["text"])
         )
-        entity["preflabel"] = preflabel
-        entity["wikidata"] = wikidata
-        entity["adamlink"] = adamlink
-        entity["longitude"] = longitude
-        entity["latitude"] = latitude
         # if not wikidata:
         #     adamlink = self.location_linker.find_building_match(entity["text"])
         #     entity["adamlink"] = adamlink
@@ -77,9 +146,10 @@ class EntityExtracter(Extracter):
 
 
 class LLMTopicExtracter(Extracter):
-    def __init__(self):
+    def __init__(self, pool: Optional[LLMRequestPool] = None):
         self.model_name: str = config.topics.model_name
         self.model = None
+        self.pool = pool or LLMRequestPool()
 
     def load_model(self):
         pass
@@ -97,23 +167,33 @@ class LLMTopicExtracter(Extracter):
             {"role": "user", "content": "[DOCUMENT]"},
         ]
 
+    def build_request(self, chunk):
+        model_input = self.get_message_template()
+        model_input[-1]["content"] = model_input[-1]["content"].replace(
+            "[DOCUMENT]", chunk.text
+        )
+        return {"model": self.model_name, "messages": model_input}
+
     def extract(self, interview: Interview):
-        logging.info(f"Extracting entities using {self.model_name}")
-        for chunk in interview.transcript.chunks:
-            model_input = self.get_message_template()
-            model_input[-1]["content"] = model_input[-1]["content"].replace(
-                "[DOCUMENT]", chunk.text
-            )
-            response: ChatResponse = chat(model=self.model_name, messages=model_input)
-            topics = [topic.strip() for topic in response.message.content.split(",")]
+        self.extract_batch([interview])
+
+    def extract_batch(self, interviews: List[Interview]):
+        logging.info(f"Extracting topics using {self.model_name}")
+        items = [
+            (interview, chunk)
+            for interview in interviews
+            for chunk in interview.transcript.chunks
+        ]
+        responses = self.pool.chat([self.build_request(chunk) for _, chunk in items])
+        for (interview, chunk), content in zip(items, responses):
+            if content is None:
+                logging.warning(f"No LLM topics for {chunk.id}, its request failed")
+                continue
+            topics = [topic.strip() for topic in content.split(",")]
             interview.chunk_topics.append({"chunk_id": chunk.id, "topics": topics})
 
     def aggregate_topics(self, interview):
-        topic_counter = Counter()
-        for chunk_topics in interview.chunk_topics:
-            topic_counter.update([topic.lower() for topic in chunk_topics["topics"]])
-        logging.info(f"Found the following topics: {topic_counter}")
-        interview.topics = topic_counter.most_common(5)
+        aggregate_topics(interview)
 
 
 class LocationOutput(BaseModel):
@@ -127,8 +207,9 @@ class ChunkLocations(BaseModel):
 
 
 class LLMLocationExtracter(Extracter):
-    def __init__(self):
+    def __init__(self, pool: Optional[LLMRequestPool] = None):
         self.model_name: str = config.topics.model_name
+        self.pool = pool or LLMRequestPool()
 
     def get_message_template(self):
         loc_no_explanations = [
@@ -155,28 +236,251 @@ class LLMLocationExtracter(Extracter):
         ]
         return loc_short_explanation
 
+    def build_request(self, chunk, extracted_locations):
+        model_input = self.get_message_template()
+        model_input[-1]["content"] = model_input[-1]["content"].replace(
+            "[DOCUMENT]", chunk.text
+        )
+        model_input[-1]["content"] = model_input[-1]["content"].replace(
+            "[LOCATIONS]", ",".join(extracted_locations)
+        )
+        return {
+            "model": self.model_name,
+            "messages": model_input,
+            "format": ChunkLocations.model_json_schema(),
+        }
+
     def extract(self, interview: Interview):
-        for chunk in interview.transcript.chunks:
-            extracted_locations = [
-                ent["text"]
-                for ent in interview.entities
-                if ent["label"] == "Location" and ent["chunk_id"] == chunk.id
-            ]
-            model_input = self.get_message_template()
-            model_input[-1]["content"] = model_input[-1]["content"].replace(
-                "[DOCUMENT]", chunk.text
-            )
-            model_input[-1]["content"] = model_input[-1]["content"].replace(
-                "[LOCATIONS]", ",".join(extracted_locations)
-            )
-            response: ChatResponse = chat(
-                model=self.model_name,
-                messages=model_input,
-                format=ChunkLocations.model_json_schema(),
-            )
-            output = ChunkLocations.model_validate_json(response.message.content)
+        self.extract_batch([interview])
+
+    def extract_batch(self, interviews: List[Interview]):
+        items = []
+        requests = []
+        for interview in interviews:
+            chunk_locations = defaultdict(list)
+            for ent in interview.entities:
+                if ent["label"] == "Location":
+                    chunk_locations[ent["chunk_id"]].append(ent["text"])
+            for chunk in interview.transcript.chunks:
+                items.append((interview, chunk))
+                requests.append(self.build_request(chunk, chunk_locations[chunk.id]))
+        responses = self.pool.chat(requests, parse=ChunkLocations.model_validate_json)
+        for (interview, chunk), output in zip(items, responses):
+            if output is None:
+                logging.warning(f"No valid LLM locations for {chunk.id}")
+                continue
             # locations = [loc.strip() for loc in response.message.content.split(",")]
             interview.chunk_locations.append(
                 {"chunk_id": chunk.id, "locations": output}
             )
-            print(response.message.content)
+            logging.debug(output)
+
+
+class ChunkAnalysis(BaseModel):
+    topics: List[str]
+    locations: List[LocationOutput]
+
+
+class TaggedChunkAnalysis(ChunkAnalysis):
+    chunk_id: str
+
+
+class PackedChunkAnalysis(BaseModel):
+    chunks: List[TaggedChunkAnalysis]
+
+
+class LLMChunkExtracter(Extracter):
+    """Extracts topics and location corrections for a chunk in a single structured request.
+
+    With topics.pack_chunks, consecutive chunks of an interview are sent together,
+    each tagged with its chunk id, up to topics.context_tokens per request. The
+    instructions then only have to be processed once per pack, and because they
+    form an identical prefix for every request the server can reuse them.
+    """
+
+    def __init__(self, pool: Optional[LLMRequestPool] = None):
+        self.model_name: str = config.topics.model_name
+        self.pool = pool or LLMRequestPool()
+        self.pack = config.topics.pack_chunks
+        self.context_tokens: int = config.topics.context_tokens
+        self.response_tokens: int = config.topics.response_tokens_per_chunk
+
+    def get_message_template(self):
+        return [
+            {
+                "role": "system",
+                "content": "You are an assistant helping with analysing a piece of Dutch text from an interview about Amsterdam. You do two things. First, find relevant themes and concepts, focusing on larger and more abstract themes, as short keywords. Second, you also receive a list of locations that are extracted. Respond with locations in Amsterdam that are missing, have likely misspellings due to transcription (example: Diemenpark instead of Diemerpark) or locations that do not have a literal mention (example: deduct which specific theatre is mentioned), each with a short explanation why you are outputting them. Do not return locations that are too general, such as Nederland or Amsterdam. Always reply in Dutch.",
+            },
+            {
+                "role": "user",
+                "content": "Welke thema's, concepten en locaties komen hier voor? Geef de thema's als korte keywords, en de locaties met korte uitleg en of het correcties zijn, nieuwe locaties of afgeleide locaties (die niet expliciet genoemd worden).",
+            },
+            {"role": "user", "content": "[DOCUMENT] \n Gevonden locaties: [LOCATIONS]"},
+        ]
+
+    def get_packed_message_template(self):
+        model_input = self.get_message_template()
+        model_input[0]["content"] += (
+            " The text is split into fragments that each start with their chunk_id "
+            "between square brackets, followed by the locations found in that fragment. "
+            "Answer for every fragment separately, with its chunk_id."
+        )
+        model_input[-1]["content"] = "[DOCUMENT]"
+        return model_input
+
+    @staticmethod
+    def estimate_tokens(text):
+        # rough estimate for Dutch text, avoids loading the LLM's tokenizer
+        return len(text) // 3 + 1
+
+    def build_request(self, chunk, extracted_locations):
+        model_input = self.get_message_template()
+        model_input[-1]["content"] = model_input[-1]["content"].replace(
+            "[DOCUMENT]", chunk.text
+        )
+        model_input[-1]["content"] = model_input[-1]["content"].replace(
+            "[LOCATIONS]", ",".join(extracted_locations)
+        )
+        return {
+            "model": self.model_name,
+            "messages": model_input,
+            "format": ChunkAnalysis.model_json_schema(),
+        }
+
+    def format_fragment(self, chunk, extracted_locations):
+        return f"[{chunk.id}]\n{chunk.text}\nGevonden locaties: {','.join(extracted_locations)}\n"
+
+    def build_packed_request(self, fragments):
+        model_input = self.get_packed_message_template()
+        model_input[-1]["content"] = "\n".join(fragments)
+        return {
+            "model": self.model_name,
+            "messages": model_input,
+            "format": PackedChunkAnalysis.model_json_schema(),
+            "options": {"num_ctx": self.context_tokens},
+        }
+
+    def pack_chunks(self, chunks, chunk_locations):
+        """Group consecutive chunks into requests that fit the context size."""
+        instructions = sum(
+            self.estimate_tokens(message["content"])
+            for message in self.get_packed_message_template()
+        )
+        packs = []
+        current, fragments = [], []
+        used = instructions
+        for chunk in chunks:
+            fragment = self.format_fragment(chunk, chunk_locations[chunk.id])
+            cost = self.estimate_tokens(fragment) + self.response_tokens
+            if current and used + cost > self.context_tokens:
+                packs.append((current, self.build_packed_request(fragments)))
+                current, fragments = [], []
+                used = instructions
+            current.append(chunk)
+            fragments.append(fragment)
+            used += cost
+        if current:
+            packs.append((current, self.build_packed_request(fragments)))
+        return packs
+
+    def extract(self, interview: Interview):
+        self.extract_batch([interview])
+
+    @staticmethod
+    def packed_parser(chunks):
+        """Parser for the reply to a pack of chunks, giving the analysis per chunk id.
+
+        A reply that leaves out any of the chunks is rejected, so it is not
+        cached and its chunks can be asked for again.
+        """
+        expected = [chunk.id for chunk in chunks]
+
+        def parse(content):
+            output = PackedChunkAnalysis.model_validate_json(content)
+            analyses = {analysis.chunk_id: analysis for analysis in output.chunks}
+            missing = [chunk_id for chunk_id in expected if chunk_id not in analyses]
+            if missing:
+                raise ValueError(f"Packed LLM reply leaves out {', '.join(missing)}")
+            return analyses
+
+        return parse
+
+    def extract_batch(self, interviews: List[Interview]):
+        """Analyse the chunks of all interviews, packed when topics.pack_chunks is set.
+
+        The chunks of a pack whose reply is invalid or incomplete are asked
+        for again one by one.
+        """
+        logging.info(f"Extracting topics and locations using {self.model_name}")
+        locations = {}
+        for interview in interviews:
+            chunk_locations = defaultdict(list)
+            for ent in interview.entities:
+                if ent["label"] == "Location":
+                    chunk_locations[ent["chunk_id"]].append(ent["text"])
+            locations[id(interview)] = chunk_locations
+
+        # analyses by (interview, chunk id)
+        analyses = {}
+        single = []
+        if self.pack:
+            packs = [
+                (interview, chunks, request)
+                for interview in interviews
+                for chunks, request in self.pack_chunks(
+                    interview.transcript.chunks, locations[id(interview)]
+                )
+            ]
+            outputs = self.pool.chat(
+                [request for _, _, request in packs],
+                parse=[self.packed_parser(chunks) for _, chunks, _ in packs],
+            )
+            for (interview, chunks, _), output in zip(packs, outputs):
+                if output is None:
+                    logging.warning(
+                        f"No complete LLM analysis for {', '.join(chunk.id for chunk in chunks)}, "
+                        "asking for them one by one"
+                    )
+                    single.extend((interview, chunk) for chunk in chunks)
+                    continue
+                for chunk in chunks:
+                    analyses[id(interview), chunk.id] = output[chunk.id]
+        else:
+            single = [
+                (interview, chunk)
+                for interview in interviews
+                for chunk in interview.transcript.chunks
+            ]
+
+        outputs = self.pool.chat(
+            [
+                self.build_request(chunk, locations[id(interview)][chunk.id])
+                for interview, chunk in single
+            ],
+            parse=ChunkAnalysis.model_validate_json,
+        )
+        for (interview, chunk), output in zip(single, outputs):
+            if output is not None:
+                analyses[id(interview), chunk.id] = output
+
+        for interview in interviews:
+            for chunk in interview.transcript.chunks:
+                analysis = analyses.get((id(interview), chunk.id))
+                if analysis is None:
+                    logging.warning(f"No valid LLM analysis for {chunk.id}")
+                    continue
+                interview.chunk_topics.append(
+                    {
+                        "chunk_id": chunk.id,
+                        "topics": [topic.strip() for topic in analysis.topics],
+                    }
+                )
+                interview.chunk_locations.append(
+                    {
+                        "chunk_id": chunk.id,
+                        "locations": ChunkLocations(locations=analysis.locations),
+                    }
+                )
+
+    def aggregate_topics(self, interview):
+        aggregate_topics(interview)
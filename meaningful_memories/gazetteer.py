@@ -0,0 +1,310 @@
+import csv
+import logging
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+from bisect import bisect_left
+
+import numpy as np
+
+from meaningful_memories import here
+from meaningful_memories.config import config
+from meaningful_memories.registry import registry
+
+STREETS_PATH = os.path.join(here, "data/streets.csv")
+BUILDINGS_PATH = os.path.join(here, "data/adamlinkgebouwen.ttl")
+
+# string fields are (start, end) byte offsets into strings.bin
+RECORD_DTYPE = np.dtype(
+    [
+        ("uri", "<u4", 2),
+        ("preflabel", "<u4", 2),
+        ("wikidata", "<u4", 2),
+        ("since", "<i2"),
+        ("until", "<i2"),
+        ("longitude", "<f8"),
+        ("latitude", "<f8"),
+    ]
+)
+LABEL_DTYPE = np.dtype([("normalized", "<u4", 2), ("label", "<u4", 2), ("record", "<u4")])
+
+
+def normalize_label(label: str):
+    """Case- and accent-insensitive form of a label, used for exact lookups."""
+    decomposed = unicodedata.normalize("NFKD", label.casefold())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.split())
+
+
+def wkt_centroid(wkt: str):
+    """(longitude, latitude) of a WKT POINT, or the area-weighted centroid of the outer rings of a (MULTI)POLYGON."""
+    wkt = wkt.strip()
+    if wkt.startswith("POINT"):
+        x, y = re.findall(r"-?[\d.]+", wkt)[:2]
+        return float(x), float(y)
+    # outer ring of every polygon: the first ring after each "((" opening
+    rings = re.findall(r"\(\(([^()]*)\)", wkt)
+    total_area = cx = cy = 0.0
+    for ring in rings:
+        points = np.array([[float(v) for v in point.split()] for point in ring.split(",")])
+        x, y = points[:, 0], points[:, 1]
+        cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+        area = cross.sum() / 2
+        if area == 0:
+            continue
+        total_area += area
+        cx += ((x[:-1] + x[1:]) * cross).sum() / 6
+        cy += ((y[:-1] + y[1:]) * cross).sum() / 6
+    if total_area == 0:
+        points = np.array(
+            [[float(v) for v in point.split()] for ring in rings for point in ring.split(",")]
+        )
+        return float(points[:, 0].mean()), float(points[:, 1].mean())
+    return cx / total_area, cy / total_area
+
+
+def _year(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def read_streets(path=STREETS_PATH):
+    with open(path, mode="r", newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file, delimiter=";"):
+            yield {
+                "uri": row["adamlink_uri"],
+                "preflabel": row["preflabel"],
+                "wikidata": row["wikidata"],
+                "since": _year(row["since_min"]),
+                "until": _year(row["until_max"]),
+                "longitude": np.nan,
+                "latitude": np.nan,
+                "altlabels": [],
+            }
+
+
+def read_buildings(path=BUILDINGS_PATH):
+    """Parse the building resources of the AdamLink Turtle export."""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    for block in re.split(r"\n(?=<)", content):
+        uri = re.match(r"<([^>]+)>", block)
+        preflabel = re.search(r'^  skos:prefLabel "((?:[^"\\]|\\.)*)"', block, re.M)
+        if not uri or not preflabel:
+            continue
+        same_as = re.search(r"^  owl:sameAs (.*?) ;$", block, re.M)
+        wikidata = ""
+        if same_as:
+            wikidata = next(
+                (u for u in re.findall(r"<([^>]+)>", same_as.group(1)) if "wikidata" in u),
+                "",
+            )
+        altlabels = re.search(r"^  skos:altLabel (.*?) [;.]$", block, re.M)
+        wkt = re.search(r'geo:asWKT "([^"]+)"', block)
+        longitude, latitude = wkt_centroid(wkt.group(1)) if wkt else (np.nan, np.nan)
+        since = re.search(r'^  sem:hasEarliestBeginTimeStamp "(-?\d+)"', block, re.M)
+        until = re.search(r'^  sem:hasLatestEndTimeStamp "(-?\d+)"', block, re.M)
+        yield {
+            "uri": uri.group(1),
+            "preflabel": preflabel.group(1),
+            "wikidata": wikidata,
+            "since": _year(since.group(1)) if since else 0,
+            "until": _year(until.group(1)) if until else 0,
+            "longitude": longitude,
+            "latitude": latitude,
+            "altlabels": re.findall(r'"((?:[^"\\]|\\.)*)"', altlabels.group(1))
+            if altlabels
+            else [],
+        }
+
+
+class Gazetteer:
+    """Compiled AdamLink gazetteer of streets and buildings.
+
+    The compiled form is a directory with two numpy tables (records and
+    labels) and one UTF-8 string blob. All three are memory-mapped read-only,
+    so loading takes milliseconds and worker processes share the same pages.
+    Labels (preferred and alternative) are sorted by their normalized form,
+    which allows exact lookups by binary search without building a dict.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._uri_index = None
+        self.records = np.load(os.path.join(directory, "records.npy"), mmap_mode="r")
+        self.label_table = np.load(os.path.join(directory, "labels.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "strings.bin"), "rb") as f:
+            self.strings = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.records)
+
+    def string(self, ref):
+        return self.strings[int(ref[0]) : int(ref[1])].decode("utf-8")
+
+    def record(self, index):
+        record = self.records[index]
+        return {
+            "adamlink_uri": self.string(record["uri"]),
+            "preflabel": self.string(record["preflabel"]),
+            "wikidata": self.string(record["wikidata"]),
+            "since": int(record["since"]),
+            "until": int(record["until"]),
+            "longitude": float(record["longitude"]),
+            "latitude": float(record["latitude"]),
+        }
+
+    @property
+    def uri_index(self):
+        """Record index per URI, built once per process on first use."""
+        if self._uri_index is None:
+            self._uri_index = {
+                self.string(uri): i for i, uri in enumerate(self.records["uri"])
+            }
+        return self._uri_index
+
+    def coordinates(self, uris):
+        """(longitude, latitude) per URI, or None for unknown URIs and records without a geometry."""
+        found = [self.uri_index.get(uri) for uri in uris]
+        indices = [i for i in found if i is not None]
+        longitudes = self.records["longitude"][indices]
+        latitudes = self.records["latitude"][indices]
+        by_index = {
+            i: None if np.isnan(lon) else (float(lon), float(lat))
+            for i, lon, lat in zip(indices, longitudes, latitudes)
+        }
+        return [by_index.get(i) for i in found]
+
+    def labels(self):
+        """(label, record index) for every label, in normalized order."""
+        return [
+            (self.string(row["label"]), int(row["record"])) for row in self.label_table
+        ]
+
+    def _positions(self, label):
+        """Positions in the label table whose label normalizes to the same form as label."""
+        key = normalize_label(label)
+        normalized = _NormalizedView(self)
+        position = bisect_left(normalized, key)
+        while position < len(self.label_table) and normalized[position] == key:
+            yield position
+            position += 1
+
+    def find(self, label):
+        """Record indices whose label normalizes to the same form as label."""
+        return [int(self.label_table[position]["record"]) for position in self._positions(label)]
+
+    def find_exact(self, label):
+        """Index of the first record with exactly this label (preferred labels first), or None."""
+        for position in self._positions(label):
+            row = self.label_table[position]
+            if self.string(row["label"]) == label:
+                return int(row["record"])
+        return None
+
+    @staticmethod
+    def build(directory, streets_path=STREETS_PATH, buildings_path=BUILDINGS_PATH):
+        records = list(read_streets(streets_path)) + list(read_buildings(buildings_path))
+        blob = bytearray()
+        offsets = {}
+
+        def ref(text):
+            if text not in offsets:
+                start = len(blob)
+                blob.extend(text.encode("utf-8"))
+                offsets[text] = (start, len(blob))
+            return offsets[text]
+
+        record_table = np.zeros(len(records), dtype=RECORD_DTYPE)
+        labels = []
+        for i, record in enumerate(records):
+            record_table[i] = (
+                ref(record["uri"]),
+                ref(record["preflabel"]),
+                ref(record["wikidata"]),
+                record["since"],
+                record["until"],
+                record["longitude"],
+                record["latitude"],
+            )
+            for label in [record["preflabel"]] + record["altlabels"]:
+                labels.append((normalize_label(label), label, i))
+        # preferred labels come first within equal normalized forms (stable sort)
+        labels.sort(key=lambda item: item[0])
+        label_table = np.zeros(len(labels), dtype=LABEL_DTYPE)
+        for i, (normalized, label, record_index) in enumerate(labels):
+            label_table[i] = (ref(normalized), ref(label), record_index)
+
+        # written next to the target and moved in place, so concurrent
+        # readers never see a half-written gazetteer
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent)
+        os.chmod(tmp_dir, 0o755)
+        np.save(os.path.join(tmp_dir, "records.npy"), record_table)
+        np.save(os.path.join(tmp_dir, "labels.npy"), label_table)
+        with open(os.path.join(tmp_dir, "strings.bin"), "wb") as f:
+            f.write(blob)
+        # an outdated gazetteer is moved aside rather than deleted first, so it
+        # stays in place until the new one is complete; processes that mapped
+        # it keep reading their pages after it is removed
+        stale_dir = None
+        if os.path.exists(directory):
+            stale_dir = tempfile.mkdtemp(dir=parent)
+            try:
+                os.rename(directory, os.path.join(stale_dir, "gazetteer"))
+            except OSError:
+                # moved aside by another process in the meantime
+                pass
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # built by another process in the meantime
+            shutil.rmtree(tmp_dir)
+        if stale_dir is not None:
+            shutil.rmtree(stale_dir)
+        logging.info(
+            f"Built gazetteer with {len(records)} records and {len(labels)} labels in {directory}"
+        )
+
+
+class _NormalizedView:
+    """Sequence view of the normalized labels, for bisect."""
+
+    def __init__(self, gazetteer):
+        self.gazetteer = gazetteer
+
+    def __len__(self):
+        return len(self.gazetteer.label_table)
+
+    def __getitem__(self, index):
+        return self.gazetteer.string(self.gazetteer.label_table[index]["normalized"])
+
+
+def gazetteer_path():
+    return os.path.expanduser(config.gazetteer.path or os.path.join(here, "data/gazetteer"))
+
+
+def is_up_to_date(path, sources=(STREETS_PATH, BUILDINGS_PATH)):
+    compiled = os.path.join(path, "strings.bin")
+    if not os.path.exists(compiled):
+        return False
+    built = os.path.getmtime(compiled)
+    return all(os.path.getmtime(source) <= built for source in sources)
+
+
+def load_gazetteer():
+    path = gazetteer_path()
+    if not is_up_to_date(path):
+        logging.info(f"Compiled gazetteer at {path} is missing or outdated, building it now.")
+        Gazetteer.build(path)
+    return Gazetteer(path)
+
+
+def get_gazetteer():
+    return registry.get(("gazetteer", gazetteer_path()), load_gazetteer)
@@ -1,15 +1,17 @@
-import json
 import logging
 import os
-import re
 import uuid
 from pathlib import Path
 from typing import Optional
 
 from meaningful_memories.annotation_utils import generate_web_annotations
+from meaningful_memories.config import config
+from meaningful_memories.entity import Entity
+from meaningful_memories.output import (find_output, read_output, write_json,
+                                        write_output)
 from meaningful_memories.transcript import Transcript
-from meaningful_memories.utils import (color_entities_html,
-                                       extract_audio_from_video)
+from meaningful_memories.utils import (extract_audio_from_video,
+                                       write_tagged_html)
 
 
 class Interview:
@@ -59,96 +61,32 @@ class Interview:
             self.audio_path = os.path.join(self.input_dir, "interview.wav")
 
     def combine_chunks(self):
-        chunk_offsets = {}
-        transcript_all = ""
-        offset = 0
-        for chunk in self.transcript.chunks:
-            chunk_offsets[chunk.id] = offset
-            separator = "\n"
-            transcript_all += chunk.text + separator
-            offset += len(chunk.text + separator)
+        index = self.transcript.index
+        self.transcript.transcript_all = index.text
 
         for entity in self.entities:
-            local_start = entity["start"]
-            local_end = entity["end"]
-            chunk_id = entity["chunk_id"]
-            chunk_offset = chunk_offsets[chunk_id]
-
-            entity["global_start"] = local_start + chunk_offset
-            entity["global_end"] = local_end + chunk_offset
-
-        self.transcript.transcript_all = transcript_all
-
-        line_offsets = []
-        full_text = ""
-        running_offset = 0
-        for line in self.transcript.get_lines():
-            text = line["text"]
-            start_offset = running_offset
-            end_offset = start_offset + len(text)
-            line_offsets.append(
-                {
-                    "start": start_offset,
-                    "end": end_offset,
-                    "timestamp": line["timestamp"],
-                    "text": text,
-                }
+            if entity.get("chunk_index") is None:
+                continue
+            entity["global_start"] = index.global_offset(entity["chunk_index"], entity["start"])
+            entity["global_end"] = index.global_offset(entity["chunk_index"], entity["end"])
+            # the words of the entity rather than the whole chunk, when aligned
+            word_timestamps = self.transcript.get_word_timestamps(
+                entity["global_start"], entity["global_end"]
             )
-            running_offset = end_offset
-            full_text += text
-
-        for entity in self.entities:
-            g_start = entity["global_start"]
-            for i, line in enumerate(line_offsets):
-                if line["start"] <= g_start < line["end"]:
-                    entity["line_index"] = i
-                    entity["line_timestamp"] = line["timestamp"]
-                    entity["line_text"] = line["text"]
-                    break
-            else:
-                entity["line_index"] = None
-                entity["line_timestamp"] = None
-                entity["line_text"] = None
+            if word_timestamps is not None:
+                entity["timestamps"] = word_timestamps
+            location = index.locate(entity["global_start"])
+            entity["line_index"] = location["line_index"]
+            entity["line_timestamp"] = location["line_timestamp"]
+            entity["line_text"] = location["line_text"]
 
     def visualize(self):
-        all_chunks_marked = ""
-
-        for chunk in self.transcript.chunks:
-            text = chunk.text
-            chunk_entities = [
-                ent for ent in self.entities if chunk.id == ent["chunk_id"]
-            ]
-
-            entity_replacements = []
-
-            for ent in chunk_entities:
-                if ent["score"] > 0.8:
-                    link = ent.get("adamlink", "")
-                    if not link:
-                        link = ent.get("gtaa_subject", "")
-                    start, end = ent["start"], ent["end"]
-                    entity_text = text[start:end]  # Extract the exact entity text
-                    replacement = color_entities_html(entity_text, ent["label"], link)
-                    entity_replacements.append((start, end, replacement))
-
-            entity_replacements.sort(reverse=True, key=lambda x: x[0])
-
-            for start, end, replacement in entity_replacements:
-                text = text[:start] + replacement + text[end:]
-
-            # Preserve line breaks after sentence-ending punctuation
-            text = re.sub(r"(?<=[a-zA-Z0-9])([.!?])(\s|$)", r"\1<br>\2", text)
-
-            all_chunks_marked += text
-        topics = "".join(["<li>" + topic[0] + "</li>" for topic in self.topics])
-        topic_information = f"<br><br> Topics: <ul>{topics}</ul>"
-        all_chunks_marked += topic_information
-        with open(
-            os.path.join(self.input_dir, "interview_transcript_tagged.html"), "w"
-        ) as f:
-            f.write(
-                f"<!DOCTYPE html>\n<html>\n<head><meta charset='UTF-8' name='viewport' content='width=device-width, initial-scale=1'>>\n</head>\n<body>\n{all_chunks_marked}\n</body>\n</html>"
-            )
+        write_tagged_html(
+            os.path.join(self.input_dir, "interview_transcript_tagged.html"),
+            self.transcript.chunks,
+            self.entities,
+            self.topics,
+        )
 
     def write_to_file(self, args):
         entity_results = []
@@ -186,7 +124,7 @@ class Interview:
                     )
         output_data = {
             "metadata": {"label": self.interview_label},
-            "entities": self.entities,
+            "entities": [ent.to_dict() for ent in self.entities],
             "topics_chunk": self.chunk_topics,
             "topics_aggregate": self.topics,
             "locations_chunk": [
@@ -199,7 +137,12 @@ class Interview:
                 for loc in self.chunk_locations
             ],
             "transcript_chunks": [
-                {"id": chunk.id, "timestamp": chunk.timestamp, "text": chunk.text}
+                {
+                    "id": chunk.id,
+                    "timestamp": chunk.timestamp,
+                    "text": chunk.text,
+                    "overlap": chunk.overlap,
+                }
                 for chunk in self.transcript.chunks
             ],
             "transcript_raw": self.transcript.transcription_raw,
@@ -208,23 +151,25 @@ class Interview:
             },  # labelstudio friendly format
             "predictions": [{"result": entity_results}],
         }
-        with open(
-            os.path.join(self.input_dir, f"{self.interview_label}.json"), "w"
-        ) as f:
-            json.dump(output_data, f)
+        write_output(
+            os.path.join(self.input_dir, f"{self.interview_label}.json"), output_data
+        )
 
         w3_annotations = generate_web_annotations(
             output_data, self.interview_label, text_only=args.text_only
         )
-        with open(
-            os.path.join(self.input_dir, "annotations.jsonld"), "w", encoding="utf-8"
-        ) as f:
-            json.dump(w3_annotations, f, ensure_ascii=False, indent=2)
+        write_json(
+            os.path.join(self.input_dir, "annotations.jsonld"),
+            w3_annotations,
+            indent=config.output.pretty_annotations,
+        )
 
     def load_from_file(self):
-        with open(os.path.join(self.input_dir, "interview.json"), "r") as f:
-            interview_data = json.load(f)
-        self.entities = interview_data["entities"]
+        output_path = find_output(
+            os.path.join(self.input_dir, f"{self.interview_label}.json")
+        ) or find_output(os.path.join(self.input_dir, "interview.json"))
+        interview_data = read_output(output_path)
+        self.entities = [Entity.from_dict(ent) for ent in interview_data["entities"]]
         self.transcript = Transcript(interview_data["transcript_raw"])
         self.topics = interview_data["topics_aggregate"]
         # self.transcript.chunks = [TranscriptChunk(x["id"], x["text"], x["timestamp"][0], x["timestamp"][1]) for x in interview_data["transcript_chunmks"]]
@@ -1,13 +1,22 @@
-import csv
+import json
 import logging
+import math
 import os
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 
+import numpy as np
 import requests
-from rapidfuzz import process
+from rapidfuzz import fuzz, process
+from requests.adapters import HTTPAdapter
 
-from meaningful_memories import here
+from meaningful_memories.cache import ResponseCache
 from meaningful_memories.config import config
+from meaningful_memories.gazetteer import get_gazetteer
+from meaningful_memories.registry import registry
+from meaningful_memories.thesaurus import ThesaurusIndex, index_path
 
 
 class Linker:
@@ -15,50 +24,161 @@ class Linker:
         self.name = ""
 
 
+class LabelIndex:
+    """Length-bucketed index over gazetteer labels for fuzzy matching with WRatio.
+
+    WRatio can only score above 90 for strings whose lengths differ by less
+    than a factor 1.5; beyond that it falls back to scaled partial ratios.
+    For score cutoffs above 90 only labels in that length window are scored.
+    Candidates keep their original order, so ties resolve exactly as with
+    extractOne over all labels.
+    """
+
+    def __init__(self, labels):
+        self.labels = list(labels)
+        self.positions = {label: i for i, label in enumerate(self.labels)}
+        self.by_length = sorted(range(len(self.labels)), key=lambda i: len(self.labels[i]))
+        self.lengths = [len(self.labels[i]) for i in self.by_length]
+
+    def window(self, min_length, max_length, score_cutoff):
+        """Positions of the labels that can reach score_cutoff for queries of the given lengths."""
+        if score_cutoff <= 90:
+            return list(range(len(self.labels)))
+        low = bisect_right(self.lengths, min_length / 1.5)
+        high = bisect_left(self.lengths, max_length * 1.5)
+        return sorted(self.by_length[low:high])
+
+    def extract_many(self, queries: List[str], score_cutoff):
+        """Best label per query (or None).
+
+        Exact matches are returned directly; the other queries are grouped by
+        length and each group is scored against its window in one cdist call.
+        """
+        matches = [query if query in self.positions else None for query in queries]
+        pending = defaultdict(list)
+        for i, match in enumerate(matches):
+            if match is None:
+                pending[len(queries[i])].append(i)
+        for length, rows in pending.items():
+            window = self.window(length, length, score_cutoff)
+            if not window:
+                continue
+            candidates = [self.labels[i] for i in window]
+            scores = process.cdist(
+                [queries[i] for i in rows],
+                candidates,
+                scorer=fuzz.WRatio,
+                score_cutoff=score_cutoff,
+                dtype=np.float64,
+                workers=-1,
+            )
+            # argmax picks the first best candidate, like extractOne
+            best = scores.argmax(axis=1)
+            for row, i in enumerate(rows):
+                if scores[row, best[row]] >= score_cutoff:
+                    matches[i] = candidates[best[row]]
+        return matches
+
+
 class LocationLinker(Linker):
     def __init__(self):
-        self.data_path = os.path.join(here, "data/adamlink_streets_buildings.csv")
-        self.location_data = defaultdict(list)
         self.skip_list = ["Nederland", "Europa"]  # too often extracted and unlikely as buildings in Amsterdam
-        if not self.location_data:
-            self.load_data()
+        self.gazetteer = get_gazetteer()
+        self._index = None
 
-    def load_data(self):
-        with open(self.data_path, mode="r", newline="") as file:
-            reader = csv.DictReader(file, delimiter=",")
-            for row in reader:
-                self.location_data[row["preflabel"]] = row
+    @property
+    def index(self):
+        """LabelIndex over the distinct gazetteer labels for fuzzy matching, built on first use."""
+        if self._index is None:
+            self._index = registry.get(
+                ("adamlink-index", self.gazetteer.directory),
+                lambda: LabelIndex(
+                    dict.fromkeys(label for label, _ in self.gazetteer.labels())
+                ),
+            )
+        return self._index
 
     def find_location_match(self, location: str):
-        location = location.title()
-        if location in self.skip_list:
-            return "", "", "", "", ""
+        return self.find_location_matches([location])[0]
+
+    def find_location_matches(self, locations: List[str]):
+        """Link a list of location mentions at once, returning a result tuple per mention."""
+        queries = [location.title() for location in locations]
+        lookup = [query for query in queries if query not in self.skip_list]
         if config.entities.fuzzy_search_locations:
-            match = process.extractOne(
-                location,
-                self.location_data.keys(),
-                score_cutoff=config.entities.fuzzy_threshold,
-            )
-            match = self.location_data.get(match[0]) if match else None
+            labels = self.index.extract_many(lookup, config.entities.fuzzy_threshold)
         else:
-            match = self.location_data[location]
-        if match:
-            return match["preflabel"], match["wikidata"], match["adamlink_uri"], match["longitude"], match["latitude"]
-        else:
-            return "", "", "", "", ""
+            labels = lookup
+        # records are looked up by binary search in the gazetteer's sorted label table
+        matches = {
+            query: self.gazetteer.find_exact(label) if label is not None else None
+            for query, label in zip(lookup, labels)
+        }
+        results = []
+        for query in queries:
+            record = matches.get(query)
+            if record is not None:
+                match = self.gazetteer.record(record)
+                has_coordinates = not math.isnan(match["longitude"])
+                results.append(
+                    (
+                        match["preflabel"],
+                        match["wikidata"],
+                        match["adamlink_uri"],
+                        match["longitude"] if has_coordinates else "",
+                        match["latitude"] if has_coordinates else "",
+                    )
+                )
+            else:
+                results.append(("", "", "", "", ""))
+        return results
 
 
 class SubjectLinker(Linker):
-    def __init__(self):
-        self.api_uris = config.thesauri.uris
-        self.graphql_uri = "https://termennetwerk-api.netwerkdigitaalerfgoed.nl/graphql"
+    """Links subjects to thesaurus terms through the Termennetwerk GraphQL API.
 
-    def _query_api(self, api_uri, query_input):
+    All thesauri in config.thesauri.uris are queried in one request per label,
+    over a pooled session. Each distinct label is queried once per call, and
+    responses are cached on disk for thesauri.cache.ttl_days. In offline mode
+    labels are looked up in a local ThesaurusIndex instead.
+    """
+
+    def __init__(self, graphql_uri=None, use_cache=None, offline=None):
+        settings = config.thesauri
+        self.api_uris = settings.uris
+        offline = settings.mode == "offline" if offline is None else offline
+        self.thesaurus = (
+            registry.get(("thesaurus", index_path()), ThesaurusIndex)
+            if offline
+            else None
+        )
+        self.graphql_uri = graphql_uri or settings.endpoint
+        self.timeout = settings.timeout
+        self.concurrency = settings.concurrency
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.concurrency
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        use_cache = settings.cache.enabled if use_cache is None else use_cache
+        self.cache = (
+            ResponseCache(
+                os.path.join(config.cache.dir, "thesaurus_responses.sqlite"),
+                max_entries=settings.cache.max_entries,
+                ttl=settings.cache.ttl_days * 24 * 3600,
+            )
+            if use_cache
+            else None
+        )
+
+    def _query_api(self, sources, query_input):
         query = f"""
         query {{
           terms(
-            sources: ["{api_uri}"],
-            query: "{query_input}",
+            sources: {json.dumps(sources)},
+            query: {json.dumps(query_input, ensure_ascii=False)},
           ) {{
             source {{
               uri
@@ -107,29 +227,61 @@ class SubjectLinker(Linker):
         }}
         """
 
-        headers = {"Content-Type": "application/json"}
-
-        # Send the request
-        response = requests.post(
-            self.graphql_uri, json={"query": query}, headers=headers
-        )
+        try:
+            response = self.session.post(
+                self.graphql_uri, json={"query": query}, timeout=self.timeout
+            )
+        except requests.RequestException as error:
+            logging.error(f"Thesaurus request for {query_input!r} failed: {error!r}")
+            return None
 
         # Check for errors
-        if response.status_code == 200:
-            return response.json()
-        else:
+        if response.status_code != 200:
             logging.error(f"Error {response.status_code}: {response.text}")
-            return {}
+            return None
+        body = response.json()
+        if body.get("errors"):
+            # GraphQL reports failures with status 200; not cached, so asked again next run
+            logging.error(f"Thesaurus query for {query_input!r} failed: {body['errors']}")
+            return None
+        return body
+
+    def _request(self, label_value):
+        return {"endpoint": self.graphql_uri, "sources": self.api_uris, "query": label_value}
 
     def find_subject_matches(self, label_value):
-        all_uris = set()
-        for api_uri in self.api_uris:
-            response = self._query_api(api_uri, label_value)
-        if response:
-            uris = self.extract_uris(response)
-            for uri in uris:
-                all_uris.add(uri)
-        return list(all_uris)
+        return self.find_subject_matches_many([label_value])[label_value]
+
+    def find_subject_matches_many(self, label_values):
+        """Map each distinct label to the list of matching term URIs."""
+        if self.thesaurus is not None:
+            return self.thesaurus.find_many(label_values, self.api_uris)
+        labels = list(dict.fromkeys(label_values))
+        responses = {}
+        missing = []
+        for label in labels:
+            key = ResponseCache.key(self._request(label)) if self.cache else None
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                responses[label] = json.loads(cached)
+            else:
+                missing.append((label, key))
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                fetched = executor.map(
+                    lambda item: self._query_api(self.api_uris, item[0]), missing
+                )
+                # stored as they arrive, from this thread (sqlite connections are per thread)
+                for (label, key), response in zip(missing, fetched):
+                    if response is not None and key is not None:
+                        self.cache.put(key, json.dumps(response))
+                    responses[label] = response or {}
+        if self.cache:
+            logging.info(f"Thesaurus response cache: {self.cache.stats()}")
+        return {
+            label: list(dict.fromkeys(self.extract_uris(responses[label])))
+            for label in labels
+        }
 
     def extract_uris(self, response):
         uris = []
@@ -140,3 +292,52 @@ class SubjectLinker(Linker):
                 for item in result.get("terms", []):
                     uris.append(item.get("uri"))
         return uris
+
+
+def location_form(text: str):
+    # LocationLinker matches on the title-cased mention
+    return text.title()
+
+
+def subject_form(text: str):
+    return " ".join(text.split()).casefold()
+
+
+def set_location_match(entity: dict, match):
+    preflabel, wikidata, adamlink, longitude, latitude = match
+    entity["preflabel"] = preflabel
+    entity["wikidata"] = wikidata
+    entity["adamlink"] = adamlink
+    entity["longitude"] = longitude
+    entity["latitude"] = latitude
+
+
+def link_entities(
+    entities: List[dict], location_linker: LocationLinker, subject_linker: SubjectLinker
+):
+    """Link every distinct mention once and copy the result to all its occurrences.
+
+    Mentions are grouped by label and normalized surface form; locations
+    and subjects are each resolved in one bulk call.
+    """
+    locations = {}
+    subjects = {}
+    for ent in entities:
+        if ent["label"] == "Location":
+            locations.setdefault(location_form(ent["text"]), ent["text"])
+        elif ent["label"] not in ["Person", "Date"]:
+            subjects.setdefault(subject_form(ent["text"]), ent["text"])
+    location_matches = dict(
+        zip(locations, location_linker.find_location_matches(list(locations.values())))
+    )
+    subject_matches = subject_linker.find_subject_matches_many(subjects.values())
+    for ent in entities:
+        if ent["label"] == "Location":
+            set_location_match(ent, location_matches[location_form(ent["text"])])
+        elif ent["label"] not in ["Person", "Date"]:
+            # a fresh list per mention, so editing one entity doesn't change the others
+            ent["gtaa_subject"] = list(subject_matches[subjects[subject_form(ent["text"])]])
+    logging.info(
+        f"Linked {len(entities)} mentions through {len(locations)} distinct locations "
+        f"and {len(subjects)} distinct subjects"
+    )
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import random
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import httpx
+from ollama import AsyncClient, ResponseError
+
+from meaningful_memories.cache import ResponseCache
+from meaningful_memories.config import config
+
+
+def _is_retryable(error: Exception):
+    if isinstance(error, ResponseError):
+        # overloaded or failing server; client errors won't change on retry
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (asyncio.TimeoutError, httpx.HTTPError, ConnectionError))
+
+
+class LLMRequestPool:
+    """Sends chat requests to the Ollama server concurrently.
+
+    At most `concurrency` requests are in flight at a time, so the server's
+    parallel slots are kept busy without queueing the whole corpus on it.
+    Failed requests are retried with exponential backoff and jitter, and
+    results are returned in the order of the requests; a request that still
+    fails gives None, so the rest of the batch is kept. Responses are looked
+    up in and stored to the on-disk ResponseCache unless use_cache is off.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        use_cache: Optional[bool] = None,
+    ):
+        settings = config.llm
+        self.host = host or settings.host
+        self.concurrency = concurrency or settings.concurrency
+        self.timeout = timeout or settings.timeout
+        self.retries = settings.retries if retries is None else retries
+        self.backoff = backoff or settings.backoff
+        use_cache = settings.cache.enabled if use_cache is None else use_cache
+        self.cache = ResponseCache() if use_cache else None
+
+    async def _chat(self, client, semaphore, request: Dict, key=None, parse=None):
+        content = await self._request(client, semaphore, request)
+        # a reply that doesn't parse (e.g. truncated JSON) fails here and is not cached
+        result = parse(content) if parse else content
+        if key is not None:
+            # stored right away, so a later failure doesn't lose finished requests
+            self.cache.put(key, content)
+        return result
+
+    async def _request(self, client, semaphore, request: Dict) -> str:
+        for attempt in range(self.retries + 1):
+            try:
+                async with semaphore:
+                    response = await asyncio.wait_for(
+                        client.chat(**request), timeout=self.timeout
+                    )
+                return response.message.content
+            except Exception as error:
+                if attempt == self.retries or not _is_retryable(error):
+                    raise
+                delay = self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+                logging.warning(
+                    f"LLM request failed ({error!r}), retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def _chat_all(self, requests: List[Dict], keys: List[Optional[str]], parsers):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with AsyncClient(host=self.host) as client:
+            return await asyncio.gather(
+                *(
+                    self._chat(client, semaphore, request, key, parse)
+                    for request, key, parse in zip(requests, keys, parsers)
+                ),
+                return_exceptions=True,
+            )
+
+    def chat(
+        self,
+        requests: List[Dict],
+        parse: Union[Callable[[str], Any], List[Callable[[str], Any]], None] = None,
+    ) -> List[Optional[Any]]:
+        """Run ollama chat requests (keyword arguments of `chat`) and return the message contents.
+
+        With parse (one function for all requests, or a list with one per
+        request), each content is passed through it (e.g. a pydantic
+        model_validate_json) and its result returned instead; a reply that
+        doesn't parse counts as failed and isn't cached. The result of a
+        request that failed after its retries is None.
+        """
+        if not requests:
+            return []
+        parsers = parse if isinstance(parse, list) else [parse] * len(requests)
+        if self.cache is None:
+            return self._send(requests, parsers=parsers)
+
+        keys = [ResponseCache.key(request) for request in requests]
+        results = [
+            self._parse_cached(self.cache.get(key), parse)
+            for key, parse in zip(keys, parsers)
+        ]
+        missing = [i for i, result in enumerate(results) if result is None]
+        responses = self._send(
+            [requests[i] for i in missing],
+            [keys[i] for i in missing],
+            [parsers[i] for i in missing],
+        )
+        for i, response in zip(missing, responses):
+            results[i] = response
+        logging.info(f"LLM response cache: {self.cache.stats()}")
+        return results
+
+    @staticmethod
+    def _parse_cached(content: Optional[str], parse):
+        if content is None or parse is None:
+            return content
+        try:
+            return parse(content)
+        except Exception:
+            # stored before replies were checked; asked again
+            return None
+
+    def _send(self, requests: List[Dict], keys=None, parsers=None) -> List[Optional[Any]]:
+        if not requests:
+            return []
+        logging.info(
+            f"Sending {len(requests)} LLM requests ({self.concurrency} concurrent)"
+        )
+        results = asyncio.run(
+            self._chat_all(
+                requests,
+                keys or [None] * len(requests),
+                parsers or [None] * len(requests),
+            )
+        )
+        failed = [result for result in results if isinstance(result, BaseException)]
+        if failed:
+            logging.error(
+                f"{len(failed)} of {len(requests)} LLM requests failed, "
+                f"first error: {failed[0]!r}"
+            )
+        return [
+            None if isinstance(result, BaseException) else result
+            for result in results
+        ]
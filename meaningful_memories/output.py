@@ -0,0 +1,164 @@
+import gzip
+import json
+import os
+from collections.abc import Mapping
+from typing import Dict, Optional
+
+from meaningful_memories.cache import _json_default
+from meaningful_memories.config import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+# large parts of the output written to their own file, next to the main document;
+# entities stay in the main document, which find_fragments searches
+SIDECARS = {"transcript_raw": "segments", "predictions": "predictions"}
+
+
+def use_orjson():
+    return orjson is not None and config.output.encoder in ("auto", "orjson")
+
+
+def dumps(data, indent=False) -> bytes:
+    if use_orjson():
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, default=_json_default, option=option)
+    return json.dumps(
+        data, default=_json_default, ensure_ascii=False, indent=2 if indent else None
+    ).encode("utf-8")
+
+
+def loads(content: bytes):
+    if use_orjson():
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstandard is needed for zstd compressed output; install it or set output.compression"
+        )
+    return zstandard
+
+
+def compress(content: bytes, path: str) -> bytes:
+    if path.endswith(".gz"):
+        return gzip.compress(content, compresslevel=config.output.level or 6)
+    if path.endswith(".zst"):
+        return _zstandard().ZstdCompressor(level=config.output.level or 3).compress(content)
+    return content
+
+
+def decompress(content: bytes, path: str) -> bytes:
+    if path.endswith(".gz"):
+        return gzip.decompress(content)
+    if path.endswith(".zst"):
+        zstandard = _zstandard()
+        try:
+            return zstandard.ZstdDecompressor().decompressobj().decompress(content)
+        except zstandard.ZstdError as error:
+            raise ValueError(f"Corrupt zstd data in {path}: {error}") from error
+    return content
+
+
+def write_json(path: str, data, indent=False):
+    """Write data as JSON to path, compressed according to its extension."""
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(compress(dumps(data, indent), path))
+    os.replace(tmp_path, path)
+
+
+def read_json(path: str):
+    with open(path, "rb") as f:
+        return loads(decompress(f.read(), path))
+
+
+def find_output(base_path: str) -> Optional[str]:
+    """The existing output file for base_path (ending in .json), in any compression."""
+    for extension in EXTENSIONS.values():
+        if os.path.exists(base_path + extension):
+            return base_path + extension
+    return None
+
+
+def is_output_file(filename: str):
+    """Whether filename is a main output document (not a sidecar or partial write)."""
+    stem = filename
+    for extension in EXTENSIONS.values():
+        if extension and stem.endswith(extension):
+            stem = stem[: -len(extension)]
+    return stem.endswith(".json") and not any(
+        stem.endswith(f".{name}.json") for name in SIDECARS.values()
+    )
+
+
+def write_output(base_path: str, data: Dict, compression: Optional[str] = None):
+    """Write an interview output document, with its large parts in sidecar files.
+
+    base_path ends in .json; the compression extension is appended. The main
+    document lists the sidecars under "sidecars", relative to its folder.
+    """
+    compression = compression or config.output.compression
+    extension = EXTENSIONS[compression]
+    data = dict(data)
+    if config.output.sidecars:
+        sidecars = {}
+        for key, name in SIDECARS.items():
+            if key in data:
+                sidecar_path = f"{base_path[: -len('.json')]}.{name}.json{extension}"
+                write_json(sidecar_path, data.pop(key))
+                sidecars[key] = os.path.basename(sidecar_path)
+        data["sidecars"] = sidecars
+    path = base_path + extension
+    write_json(path, data)
+    # remove outputs of the same document in other formats, so reads are unambiguous
+    stem = base_path[: -len(".json")]
+    for other in EXTENSIONS.values():
+        if other == extension:
+            continue
+        for stale in [base_path + other] + [
+            f"{stem}.{name}.json{other}" for name in SIDECARS.values()
+        ]:
+            if os.path.exists(stale):
+                os.remove(stale)
+    return path
+
+
+class OutputDocument(Mapping):
+    """Read-only view of an interview output document.
+
+    The main document is parsed on creation; sidecar parts are only read
+    (and then kept) when their key is accessed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = read_json(path)
+        self.sidecars = self.data.pop("sidecars", {}) or {}
+
+    def __getitem__(self, key):
+        if key in self.sidecars and key not in self.data:
+            sidecar_path = os.path.join(os.path.dirname(self.path), self.sidecars[key])
+            self.data[key] = read_json(sidecar_path)
+        return self.data[key]
+
+    def __iter__(self):
+        yield from self.data
+        yield from (key for key in self.sidecars if key not in self.data)
+
+    def __len__(self):
+        return len(set(self.data) | set(self.sidecars))
+
+    def to_dict(self):
+        return {key: self[key] for key in self}
+
+
+def read_output(path: str) -> OutputDocument:
+    return OutputDocument(path)
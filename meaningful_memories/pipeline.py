@@ -2,10 +2,13 @@ import argparse
 import logging
 import os
 
-from meaningful_memories.extracter import (EntityExtracter,
+from meaningful_memories.config import config
+from meaningful_memories.extracter import (EntityExtracter, LLMChunkExtracter,
                                            LLMLocationExtracter,
-                                           LLMTopicExtracter)
+                                           LLMTopicExtracter, aggregate_topics)
 from meaningful_memories.interview import Interview
+from meaningful_memories.llm import LLMRequestPool
+from meaningful_memories.registry import registry
 from meaningful_memories.transcriber import (WhisperTranscriber,
                                              WhisperXTranscriber)
 from meaningful_memories.transcript import Transcript
@@ -14,6 +17,21 @@ from meaningful_memories.utils import read_json
 logging.basicConfig(level=logging.INFO)
 
 
+def get_llm_extracters(args):
+    # the flag only turns the cache off; otherwise llm.cache.enabled applies
+    llm_pool = LLMRequestPool(use_cache=False if args.no_llm_cache else None)
+    if config.topics.single_pass or config.topics.pack_chunks:
+        return [LLMChunkExtracter(llm_pool)]
+    return [LLMTopicExtracter(llm_pool), LLMLocationExtracter(llm_pool)]
+
+
+def run_llm_extraction(llm_extracters, interviews):
+    for llm_extracter in llm_extracters:
+        llm_extracter.extract_batch(interviews)
+    for interview in interviews:
+        aggregate_topics(interview)
+
+
 def process_interview_sample(args):
     interview = Interview(
         args.input_dir, skip_convert=args.skip_convert or args.post_process_only
@@ -24,16 +42,13 @@ def process_interview_sample(args):
             # transcriber.transcribe(interview)
             transcriber = WhisperXTranscriber()
             transcriber.transcribe(interview)
+            transcriber.close()
 
         if not args.skip_extract:
             extracter = EntityExtracter()
             extracter.extract(interview)
             if args.include_llm_topics:
-                topic_extracter = LLMTopicExtracter()
-                topic_extracter.extract(interview)
-                topic_extracter.aggregate_topics(interview)
-                location_extracter = LLMLocationExtracter()
-                location_extracter.extract(interview)
+                run_llm_extraction(get_llm_extracters(args), [interview])
         interview.combine_chunks()
         interview.visualize()
         interview.write_to_file(args)
@@ -50,18 +65,13 @@ def process_interview_batch(args, interviews):
         transcriber = WhisperXTranscriber()
         for interview in interviews:
             transcriber.transcribe(interview)
+        transcriber.close()
 
     if not args.skip_extract:
         extracter = EntityExtracter()
+        extracter.extract_batch(interviews)
         if args.include_llm_topics:
-            topic_extracter = LLMTopicExtracter()
-            location_extracter = LLMLocationExtracter()
-        for interview in interviews:
-            extracter.extract(interview)
-            if args.include_llm_topics:
-                topic_extracter.extract(interview)
-                topic_extracter.aggregate_topics(interview)
-                location_extracter.extract(interview)
+            run_llm_extraction(get_llm_extracters(args), interviews)
 
     if not args.post_process_only:
         for interview in interviews:
@@ -72,28 +82,29 @@ def process_interview_batch(args, interviews):
         for interview in interviews:
             interview.load_from_file()
             interview.visualize()
+    registry.report()
 
 
 def process_interview_batch_sequential(args, interviews):
+    if not args.skip_transcribe:
+        transcriber = WhisperXTranscriber()
+    if not args.skip_extract:
+        extracter = EntityExtracter()
+        if args.include_llm_topics:
+            llm_extracters = get_llm_extracters(args)
+
     for interview in interviews:
 
         if not args.skip_transcribe:
             # transcriber = WhisperTranscriber()
             # for interview in interviews:
             #     transcriber.transcribe(interview)
-            transcriber = WhisperXTranscriber()
             transcriber.transcribe(interview)
 
         if not args.skip_extract:
-            extracter = EntityExtracter()
-            if args.include_llm_topics:
-                topic_extracter = LLMTopicExtracter()
-                location_extracter = LLMLocationExtracter()
             extracter.extract(interview)
             if args.include_llm_topics:
-                topic_extracter.extract(interview)
-                topic_extracter.aggregate_topics(interview)
-                location_extracter.extract(interview)
+                run_llm_extraction(llm_extracters, [interview])
 
         if not args.post_process_only:
             interview.combine_chunks()
@@ -102,6 +113,9 @@ def process_interview_batch_sequential(args, interviews):
         else:
             interview.load_from_file()
             interview.visualize()
+    if not args.skip_transcribe:
+        transcriber.close()
+    registry.report()
 
 
 def main():
@@ -125,6 +139,11 @@ def main():
         "--include-llm-topics",
         action="store_true",
     )
+    parser.add_argument(
+        "--no-llm-cache",
+        action="store_true",
+        help="Always query the LLM, ignoring and not updating the response cache.",
+    )
     parser.add_argument(
         "-p",
         "--post-process-only",
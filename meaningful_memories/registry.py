@@ -0,0 +1,176 @@
+import gc
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import torch
+
+from meaningful_memories.config import config
+
+GIB = 1024**3
+
+
+class ModelEntry:
+    def __init__(self, key, model, device, size_bytes, load_time):
+        self.key = key
+        self.model = model
+        self.device = device
+        self.size_bytes = size_bytes
+        self.load_time = load_time
+        self.hits = 0
+
+    def __repr__(self):
+        return (
+            f"{self.key}: device={self.device}, size={self.size_bytes / GIB:.2f} GiB, "
+            f"load_time={self.load_time:.1f}s, hits={self.hits}"
+        )
+
+
+def _current_rss():
+    """Resident set size of this process in bytes (0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _parameter_bytes(model):
+    """Size of the torch parameters and buffers held by model, if it is (or wraps) a torch module."""
+    if isinstance(model, (tuple, list)):
+        return sum(_parameter_bytes(item) for item in model)
+    for candidate in (model, getattr(model, "model", None)):
+        if isinstance(candidate, torch.nn.Module):
+            return sum(
+                t.numel() * t.element_size()
+                for t in list(candidate.parameters()) + list(candidate.buffers())
+            )
+    return 0
+
+
+def _gpu_free(device):
+    """Free memory in bytes on the CUDA device, as seen by the driver."""
+    return torch.cuda.mem_get_info(torch.device(device))[0]
+
+
+def size_hint(name):
+    """Configured size in GiB of the model called name under models.size_gb, if any."""
+    return getattr(config.models.size_gb, name, None)
+
+
+def _is_gpu(device):
+    return str(device).startswith("cuda")
+
+
+class ModelRegistry:
+    """Process-wide store of loaded models.
+
+    Models are loaded once per key and shared between all callers. When the
+    models resident on a device exceed the configured budget, the least
+    recently used ones are dropped so the next model fits.
+    """
+
+    def __init__(self, gpu_budget_gb=None, cpu_budget_gb=None):
+        self.entries: "OrderedDict[Hashable, ModelEntry]" = OrderedDict()
+        self.known_sizes = {}  # sizes of models seen before, used to make room ahead of a reload
+        self.budgets = {
+            "gpu": (gpu_budget_gb or 0) * GIB,
+            "cpu": (cpu_budget_gb or 0) * GIB,
+        }
+
+    def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        device: Optional[str] = "cpu",
+        size_hint_gb: Optional[float] = None,
+    ):
+        if key in self.entries:
+            entry = self.entries[key]
+            entry.hits += 1
+            self.entries.move_to_end(key)
+            return entry.model
+
+        hint = int(size_hint_gb * GIB) if size_hint_gb else 0
+        self._make_room(self._pool(device), max(hint, self.known_sizes.get(key, 0)))
+        logging.info(f"Loading model {key} on {device}")
+        gpu = _is_gpu(device) and torch.cuda.is_available()
+        rss_before = _current_rss()
+        gpu_free_before = _gpu_free(device) if gpu else 0
+        start = time.perf_counter()
+        model = loader()
+        load_time = time.perf_counter() - start
+        size_bytes = _parameter_bytes(model)
+        if gpu:
+            # libraries with their own CUDA allocator (CTranslate2 for faster-whisper)
+            # hold no torch parameters, so measure what the device lost
+            size_bytes = max(size_bytes, gpu_free_before - _gpu_free(device))
+        elif not size_bytes:
+            size_bytes = _current_rss() - rss_before
+        # the configured size is a lower bound; the measurement can come out too low,
+        # e.g. when other processes free memory while the model loads
+        entry = ModelEntry(key, model, device, max(size_bytes, hint, 0), load_time)
+        self.entries[key] = entry
+        self.known_sizes[key] = entry.size_bytes
+        logging.info(f"Loaded {entry}")
+        self._make_room(self._pool(device), 0, keep=key)
+        return model
+
+    def _pool(self, device):
+        return "gpu" if _is_gpu(device) else "cpu"
+
+    def resident_bytes(self, pool):
+        return sum(
+            entry.size_bytes
+            for entry in self.entries.values()
+            if self._pool(entry.device) == pool
+        )
+
+    def _make_room(self, pool, required_bytes, keep=None):
+        """Evict least recently used models in pool until required_bytes fit in its budget."""
+        budget = self.budgets[pool]
+        if not budget:
+            return
+        for key in list(self.entries):
+            if self.resident_bytes(pool) + required_bytes <= budget:
+                break
+            if key == keep or self._pool(self.entries[key].device) != pool:
+                continue
+            self.evict(key)
+
+    def evict(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        logging.info(f"Evicting model {entry}")
+        del entry
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def clear(self):
+        for key in list(self.entries):
+            self.evict(key)
+
+    def stats(self):
+        return {
+            str(key): {
+                "device": entry.device,
+                "size_bytes": entry.size_bytes,
+                "load_time": entry.load_time,
+                "hits": entry.hits,
+            }
+            for key, entry in self.entries.items()
+        }
+
+    def report(self):
+        for entry in self.entries.values():
+            logging.info(f"Model registry: {entry}")
+
+
+registry = ModelRegistry(
+    gpu_budget_gb=config.models.gpu_memory_budget_gb,
+    cpu_budget_gb=config.models.cpu_memory_budget_gb,
+)
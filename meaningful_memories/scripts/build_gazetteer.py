@@ -0,0 +1,30 @@
+import argparse
+import logging
+import os
+import shutil
+
+from meaningful_memories.gazetteer import (BUILDINGS_PATH, STREETS_PATH,
+                                           Gazetteer, gazetteer_path)
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile the AdamLink streets and buildings into a memory-mappable gazetteer. "
+    )
+    parser.add_argument(
+        "-o", "--output-dir", help="Destination folder, defaults to gazetteer.path."
+    )
+    parser.add_argument("--streets", default=STREETS_PATH)
+    parser.add_argument("--buildings", default=BUILDINGS_PATH)
+
+    args = parser.parse_args()
+    output_dir = args.output_dir or gazetteer_path()
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    Gazetteer.build(output_dir, args.streets, args.buildings)
+
+
+if __name__ == "__main__":
+    main()
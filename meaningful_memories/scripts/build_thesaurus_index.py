@@ -0,0 +1,34 @@
+import argparse
+import logging
+
+from meaningful_memories.config import config
+from meaningful_memories.thesaurus import ThesaurusIndex, index_path
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index a local SKOS dump (N-Triples, Turtle or JSON) of the thesauri for offline subject linking. "
+    )
+    parser.add_argument(
+        "-i", "--input", nargs="+", required=True, help="Thesaurus dump file(s)."
+    )
+    parser.add_argument(
+        "-o", "--output", help="Index file, defaults to thesauri.offline.path."
+    )
+    parser.add_argument(
+        "-s",
+        "--scheme",
+        default="",
+        help="Scheme URI for terms without skos:inScheme (e.g. a single-scheme dump).",
+    )
+
+    args = parser.parse_args()
+    ThesaurusIndex.build(
+        args.output or index_path(), args.input, config.thesauri.uris, args.scheme
+    )
+
+
+if __name__ == "__main__":
+    main()
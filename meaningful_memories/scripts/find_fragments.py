@@ -3,6 +3,8 @@ import json
 import logging
 import os
 
+from meaningful_memories.output import is_output_file, read_output
+
 
 def search_entity_in_folder(folder_path, entity_name):
     results = {}
@@ -10,28 +12,25 @@ def search_entity_in_folder(folder_path, entity_name):
         sub_dir = os.path.join(folder_path, dir)
         logging.info(f"Checking folder {dir}")
         for filename in os.listdir(sub_dir):
-            if filename.endswith(".json"):
+            if is_output_file(filename):
                 file_path = os.path.join(folder_path, sub_dir, filename)
                 file_id = os.path.join(sub_dir, filename)
                 logging.info(f"Checking {file_path}")
-                with open(file_path, "r", encoding="utf-8") as file:
-                    try:
-                        data = json.load(file)
-                        entities = data["entities"]
-                        if isinstance(entities, list):
-                            matching_entries = [
-                                entry
-                                for entry in entities
-                                if entry.get("text") == entity_name
-                            ]
-                            if matching_entries:
-                                results[file_id] = matching_entries
+                try:
+                    # only the main document; raw segments stay in their sidecar
+                    data = read_output(file_path)
+                    entities = data["entities"]
+                    if isinstance(entities, list):
+                        matching_entries = [
+                            entry
+                            for entry in entities
+                            if entry.get("text") == entity_name
+                        ]
                         if matching_entries:
-                            results[file_id] = (
-                                matching_entries  # Store results if matches found
-                            )
-                    except json.JSONDecodeError:
-                        print(f"Error reading {filename}: Invalid JSON format")
+                            results[file_id] = matching_entries
+                except (ValueError, OSError, EOFError) as error:
+                    # invalid JSON or a corrupt/truncated .gz or .zst file
+                    logging.warning(f"Skipping {file_path}: {error}")
     return results
 
 
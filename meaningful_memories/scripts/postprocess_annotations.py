@@ -6,6 +6,10 @@ import os
 import re
 
 from meaningful_memories.annotation_utils import generate_web_annotations
+from meaningful_memories.config import config
+from meaningful_memories.output import (find_output, read_output, write_json,
+                                        write_output)
+from meaningful_memories.transcript_index import TranscriptIndex
 
 logging.basicConfig(level=logging.INFO)
 
@@ -31,12 +35,12 @@ def extract_entities_from_labelstudio_results(results):
 
 
 def update_entity_file_with_labelstudio(original_path, labelstudio_result):
-    with open(original_path, "r") as f:
-        original = json.load(f)
+    original = read_output(original_path).to_dict()
 
     original["entities_original"] = original.get("entities", [])
 
     new_entities = []
+    index = TranscriptIndex(original.get("transcript_chunks", []))
 
     for annotation in labelstudio_result.get("annotations", []):
         for item in annotation.get("result", []):
@@ -44,7 +48,7 @@ def update_entity_file_with_labelstudio(original_path, labelstudio_result):
                 val = item["value"]
                 start = val["start"]
                 end = val["end"]
-                chunk_info = find_chunk_info(start, original.get("transcript_chunks", []))
+                chunk_info = find_chunk_info(start, index)
 
                 ent = {
                     "global_start": start,
@@ -71,17 +75,9 @@ def update_entity_file_with_labelstudio(original_path, labelstudio_result):
     return original
 
 
-def find_chunk_info(start, transcript_chunks):
-    offset = 0
-    for chunk in transcript_chunks:
-        chunk_len = len(chunk["text"])
-        if offset <= start < offset + chunk_len:
-            return {
-                "chunk_id": chunk.get("id"),
-                "timestamp": chunk.get("timestamp")
-            }
-        offset += chunk_len
-    return {"chunk_id": None, "timestamp": None}
+def find_chunk_info(start, index: TranscriptIndex):
+    location = index.locate(start)
+    return {"chunk_id": location["chunk_id"], "timestamp": location["timestamp"]}
 
 
 def normalize_filename(name):
@@ -95,7 +91,9 @@ def find_matching_original_file(file_upload_value, original_dir):
     for original_filename in os.listdir(original_dir):
         norm_original = normalize_filename(original_filename)
         if norm_original in norm_upload or norm_upload in norm_original:
-            return os.path.join(original_dir, original_filename, original_filename + ".json")
+            return find_output(
+                os.path.join(original_dir, original_filename, original_filename + ".json")
+            )
     return None
 
 
@@ -131,22 +129,22 @@ def main():
         logging.info(f"Found matching path: {match_path}")
         if match_path:
             dir_name = os.path.basename(os.path.dirname(match_path))
-            output_file_name = os.path.basename(match_path)
+            output_file_name = f"{dir_name}.json"
             output_path = os.path.join(args.output_dir, dir_name, output_file_name)
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
             output_json = update_entity_file_with_labelstudio(match_path, item)
-            with open(output_path, "w") as f:
-                json.dump(output_json, f, indent=2)
+            output_path = write_output(output_path, output_json)
 
             w3_annotations = generate_web_annotations(
                 output_json, output_json["metadata"]["label"], text_only=args.text_only
             )
 
-            with open(
-                    os.path.join(args.output_dir, dir_name, "annotations_ls.jsonld"), "w", encoding="utf-8"
-            ) as f:
-                json.dump(w3_annotations, f, ensure_ascii=False, indent=2)
+            write_json(
+                os.path.join(args.output_dir, dir_name, "annotations_ls.jsonld"),
+                w3_annotations,
+                indent=config.output.pretty_annotations,
+            )
             print(f"Updated: {output_path}")
         else:
             print(f"No match for Label Studio file_upload: {file_upload}")
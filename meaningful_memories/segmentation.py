@@ -0,0 +1,53 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+def voice_activity(
+    audio: np.ndarray, sample_rate: int, frame_s: float = 0.03, threshold_db: float = -35
+):
+    """Per-frame speech mask: True where the frame energy is within threshold_db of the loudest frame."""
+    frame = max(1, int(frame_s * sample_rate))
+    n_frames = len(audio) // frame
+    if not n_frames:
+        return np.zeros(0, dtype=bool), frame
+    frames = audio[: n_frames * frame].reshape(n_frames, frame)
+    energy = 10 * np.log10(np.mean(frames.astype(np.float32) ** 2, axis=1) + 1e-10)
+    return energy > energy.max() + threshold_db, frame
+
+
+def silence_midpoints(
+    audio: np.ndarray, sample_rate: int, min_silence_s: float = 0.5
+) -> np.ndarray:
+    """Sample positions in the middle of every pause of at least min_silence_s."""
+    speech, frame = voice_activity(audio, sample_rate)
+    if not len(speech):
+        return np.zeros(0, dtype=np.int64)
+    # boundaries of runs of silent frames
+    padded = np.concatenate(([True], speech, [True]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = changes[::2], changes[1::2]
+    long_enough = (ends - starts) * frame >= min_silence_s * sample_rate
+    return ((starts[long_enough] + ends[long_enough]) // 2) * frame
+
+
+def split_on_silence(
+    audio: np.ndarray, n_parts: int, sample_rate: int, min_silence_s: float = 0.5
+) -> List[Tuple[int, int]]:
+    """Split audio into about n_parts (start, end) sample ranges of similar length.
+
+    Every cut is placed in the pause closest to the even split point, so no
+    word is cut in half unless the recording has no pauses at all.
+    """
+    if n_parts <= 1 or len(audio) == 0:
+        return [(0, len(audio))]
+    candidates = silence_midpoints(audio, sample_rate, min_silence_s)
+    cuts = []
+    for part in range(1, n_parts):
+        target = part * len(audio) // n_parts
+        if len(candidates):
+            target = int(candidates[np.argmin(np.abs(candidates - target))])
+        if 0 < target < len(audio) and (not cuts or target > cuts[-1]):
+            cuts.append(target)
+    bounds = [0] + cuts + [len(audio)]
+    return list(zip(bounds[:-1], bounds[1:]))
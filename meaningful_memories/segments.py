@@ -0,0 +1,138 @@
+import math
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+NAN = float("nan")
+
+
+def _float(value) -> float:
+    return NAN if value is None else float(value)
+
+
+def _value(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def _speaker(speaker):
+    # a handful of distinct labels, repeated for every segment and word
+    return sys.intern(speaker) if isinstance(speaker, str) else speaker
+
+
+class Segments:
+    """Columnar store of transcript segments and their aligned words.
+
+    Segment and word times are kept in float arrays (NaN when missing), the
+    words of all segments in one set of columns, with word_offsets marking
+    where each segment's words start. Records in the shape of the
+    transcriber output (WhisperX segments, Whisper chunks or plain text
+    parts) are only rebuilt by to_records, when writing the output.
+    """
+
+    __slots__ = (
+        "text",
+        "start",
+        "end",
+        "speaker",
+        "style",
+        "extra",
+        "word_offsets",
+        "word",
+        "word_start",
+        "word_end",
+        "word_score",
+        "word_speaker",
+    )
+
+    def __init__(self):
+        self.text: List[str] = []
+        self.start = array("d")
+        self.end = array("d")
+        self.speaker: List[Optional[str]] = []
+        # "timestamp" for Whisper chunks, "start_end" for WhisperX segments, None for plain text
+        self.style: Optional[str] = None
+        # keys outside the columns, by segment position; None when there are none
+        self.extra: Optional[Dict[int, Dict]] = None
+        self.word_offsets = array("q", [0])
+        self.word: List[str] = []
+        self.word_start = array("d")
+        self.word_end = array("d")
+        self.word_score = array("d")
+        self.word_speaker: List[Optional[str]] = []
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "Segments":
+        segments = cls()
+        for i, record in enumerate(records):
+            if "timestamp" in record:
+                segments.style = "timestamp"
+                start, end = record["timestamp"] or (None, None)
+            elif "start" in record:
+                segments.style = "start_end"
+                start, end = record.get("start"), record.get("end")
+            else:
+                start = end = None
+            segments.text.append(record["text"])
+            segments.start.append(_float(start))
+            segments.end.append(_float(end))
+            segments.speaker.append(_speaker(record.get("speaker")))
+            for word in record.get("words", []):
+                segments.word.append(word["word"])
+                segments.word_start.append(_float(word.get("start")))
+                segments.word_end.append(_float(word.get("end")))
+                segments.word_score.append(_float(word.get("score")))
+                segments.word_speaker.append(_speaker(word.get("speaker")))
+            segments.word_offsets.append(len(segments.word))
+            extra = {
+                key: value
+                for key, value in record.items()
+                if key not in ("text", "timestamp", "start", "end", "speaker", "words")
+            }
+            if extra:
+                if segments.extra is None:
+                    segments.extra = {}
+                segments.extra[i] = extra
+        return segments
+
+    def __len__(self):
+        return len(self.text)
+
+    def times(self, i: int):
+        return _value(self.start[i]), _value(self.end[i])
+
+    def words(self, i: Optional[int] = None) -> Iterator[Dict]:
+        """Words of segment i (or of all segments) as dicts with word, start, end, score and speaker."""
+        first = 0 if i is None else self.word_offsets[i]
+        last = len(self.word) if i is None else self.word_offsets[i + 1]
+        for w in range(first, last):
+            word = {"word": self.word[w]}
+            for key, column in (
+                ("start", self.word_start),
+                ("end", self.word_end),
+                ("score", self.word_score),
+            ):
+                if not math.isnan(column[w]):
+                    word[key] = column[w]
+            if self.word_speaker[w] is not None:
+                word["speaker"] = self.word_speaker[w]
+            yield word
+
+    def to_records(self) -> List[Dict]:
+        """The segments in the shape they were read from."""
+        records = []
+        for i, text in enumerate(self.text):
+            start, end = self.times(i)
+            if self.style == "timestamp":
+                record = {"timestamp": (start, end), "text": text}
+            elif self.style == "start_end":
+                record = {"start": start, "end": end, "text": text}
+            else:
+                record = {"text": text}
+            if self.word_offsets[i + 1] > self.word_offsets[i] or self.style == "start_end":
+                record["words"] = list(self.words(i))
+            if self.speaker[i] is not None:
+                record["speaker"] = self.speaker[i]
+            if self.extra and i in self.extra:
+                record.update(self.extra[i])
+            records.append(record)
+        return records
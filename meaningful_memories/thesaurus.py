@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from meaningful_memories.config import config
+from meaningful_memories.gazetteer import normalize_label
+
+SKOS = "http://www.w3.org/2004/02/skos/core#"
+LABEL_KINDS = {"prefLabel": 0, "altLabel": 1, "hiddenLabel": 2}
+
+NTRIPLE = re.compile(r'^(<[^>]*>|_:\S+)\s+<([^>]*)>\s+(.*?)\s*\.\s*$')
+LITERAL = re.compile(r'^"((?:[^"\\]|\\.)*)"')
+# N-Triples escapes: \uXXXX, \UXXXXXXXX and the ECHAR ones
+ESCAPE = re.compile(r"\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))")
+ECHARS = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+
+def index_path():
+    return os.path.expanduser(
+        config.thesauri.offline.path
+        or os.path.join(config.cache.dir, "thesaurus_index.sqlite")
+    )
+
+
+def _literal(term: str):
+    match = LITERAL.match(term)
+    if not match:
+        return None
+    return ESCAPE.sub(_unescape, match.group(1))
+
+
+def _unescape(match):
+    code = match.group(1) or match.group(2)
+    if code:
+        return chr(int(code, 16))
+    # unknown escapes are kept as they are
+    return ECHARS.get(match.group(3), match.group(0))
+
+
+def read_ntriples(path):
+    """Yield (subject, predicate, object) from an N-Triples file; literals are unescaped, URIs unwrapped."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            match = NTRIPLE.match(line)
+            if not match:
+                continue
+            subject, predicate, obj = match.groups()
+            if obj.startswith("<"):
+                obj = obj[1:-1]
+            else:
+                obj = _literal(obj)
+            yield subject.strip("<>"), predicate, obj
+
+
+def read_rdf(path):
+    """Yield triples from any RDF serialization rdflib understands (e.g. Turtle)."""
+    try:
+        import rdflib
+        from rdflib.util import guess_format
+    except ImportError:
+        raise ImportError(
+            f"rdflib is needed to read {path}; install it or convert the dump to N-Triples"
+        )
+    graph = rdflib.Graph()
+    graph.parse(path, format=guess_format(path) or "turtle")
+    for subject, predicate, obj in graph:
+        yield str(subject), str(predicate), str(obj)
+
+
+def read_json_terms(path):
+    """Yield triples from a JSON list of terms with uri, inScheme and SKOS label keys.
+
+    Values may be strings, lists of strings or JSON-LD value objects.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("@graph") or data.get("terms") or []
+
+    def values(value):
+        if value is None:
+            return []
+        if not isinstance(value, list):
+            value = [value]
+        return [v.get("@value", v.get("@id")) if isinstance(v, dict) else v for v in value]
+
+    for term in data:
+        uri = term.get("uri") or term.get("@id")
+        for scheme in values(term.get("inScheme") or term.get("skos:inScheme")):
+            yield uri, SKOS + "inScheme", scheme
+        for kind in LABEL_KINDS:
+            for label in values(term.get(kind) or term.get(f"skos:{kind}")):
+                yield uri, SKOS + kind, label
+
+
+def read_triples(path):
+    if path.endswith(".json") or path.endswith(".jsonld"):
+        return read_json_terms(path)
+    if path.endswith(".nt"):
+        return read_ntriples(path)
+    return read_rdf(path)
+
+
+class ThesaurusIndex:
+    """Local SQLite index of thesaurus labels (prefLabel, altLabel, hiddenLabel).
+
+    Labels are stored in normalized form (case, accents and whitespace
+    folded), so a lookup is a single indexed query.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or index_path()
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(
+                f"No thesaurus index at {self.path}; build it with "
+                "python -m meaningful_memories.scripts.build_thesaurus_index"
+            )
+        self.connection = sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+        )
+
+    def find_many(self, labels: Iterable[str], schemes: List[str]) -> Dict[str, List[str]]:
+        """Map each label to the URIs of terms in schemes with that label.
+
+        URIs are ordered by the order of schemes, then preferred before
+        alternative and hidden labels.
+        """
+        rank = {scheme: i for i, scheme in enumerate(schemes)}
+        matches = {}
+        for label in dict.fromkeys(labels):
+            rows = self.connection.execute(
+                "SELECT uri, scheme, kind FROM labels WHERE normalized = ?",
+                (normalize_label(label),),
+            ).fetchall()
+            rows = sorted(
+                (row for row in rows if row[1] in rank),
+                key=lambda row: (rank[row[1]], row[2]),
+            )
+            matches[label] = list(dict.fromkeys(row[0] for row in rows))
+        return matches
+
+    @staticmethod
+    def build(path, sources: List[str], schemes: List[str], default_scheme: str = ""):
+        """Index the labels of all terms in sources that belong to one of schemes.
+
+        Terms without a skos:inScheme get default_scheme.
+        """
+        term_schemes = defaultdict(set)
+        labels = []
+        for source in sources:
+            logging.info(f"Reading {source}")
+            for subject, predicate, obj in read_triples(source):
+                if not predicate.startswith(SKOS) or obj is None:
+                    continue
+                name = predicate[len(SKOS) :]
+                if name == "inScheme":
+                    term_schemes[subject].add(obj)
+                elif name in LABEL_KINDS:
+                    labels.append((subject, obj, LABEL_KINDS[name]))
+
+        rows = set()
+        for uri, label, kind in labels:
+            for scheme in term_schemes.get(uri) or {default_scheme}:
+                if scheme in schemes:
+                    rows.add((normalize_label(label), uri, scheme, kind))
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.part"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        connection = sqlite3.connect(tmp_path)
+        with connection:
+            connection.execute(
+                "CREATE TABLE labels (normalized TEXT, uri TEXT, scheme TEXT, kind INTEGER)"
+            )
+            connection.executemany("INSERT INTO labels VALUES (?, ?, ?, ?)", sorted(rows))
+            connection.execute("CREATE INDEX labels_normalized ON labels (normalized)")
+        connection.close()
+        os.replace(tmp_path, path)
+        logging.info(
+            f"Indexed {len(rows)} labels of {len({row[1] for row in rows})} terms in {path}"
+        )
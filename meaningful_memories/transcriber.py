@@ -1,8 +1,18 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
 import torch
 import whisperx
 from transformers import pipeline
 
+from meaningful_memories.batching import AdaptiveBatchSize, discover_batch_size
+from meaningful_memories.cache import file_hash, stage_cache
 from meaningful_memories.config import config
+from meaningful_memories.registry import registry, size_hint
+from meaningful_memories.segmentation import split_on_silence
 from meaningful_memories.transcript import Transcript
 from meaningful_memories.utils import get_cache_kwargs
 
@@ -10,21 +20,28 @@ from meaningful_memories.utils import get_cache_kwargs
 class WhisperTranscriber:
     def __init__(self):
         self.model_name = config.transcript.whisper.model_name
-        self.model = None
-        if not self.model:
-            self.load_model()
+        self.device = "cuda:0" if torch.cuda.is_available() else "cpu"
+        self.load_model()
+
+    @property
+    def model(self):
+        return self.load_model()
 
     def load_model(self):
-        device = "cuda:0" if torch.cuda.is_available() else "cpu"
         cache_dir = (
             get_cache_kwargs() if config.transcript.whisper.use_shared_cache else {}
         )
-        self.model = pipeline(
-            "automatic-speech-recognition",
-            model=self.model_name,
-            chunk_length_s=30,
-            device=device,
-            model_kwargs=cache_dir,
+        return registry.get(
+            ("whisper", self.model_name, self.device),
+            lambda: pipeline(
+                "automatic-speech-recognition",
+                model=self.model_name,
+                chunk_length_s=30,
+                device=self.device,
+                model_kwargs=cache_dir,
+            ),
+            device=self.device,
+            size_hint_gb=size_hint("whisper"),
         )
 
     def transcribe(self, interview, small_sample=False):
@@ -37,27 +54,228 @@ class WhisperTranscriber:
         )
 
 
+_worker_model = None
+
+
+def _init_transcription_worker(model_name, device, compute_type, threads):
+    global _worker_model
+    torch.set_num_threads(threads)
+    _worker_model = whisperx.load_model(
+        model_name, device, compute_type=compute_type, language="nl", threads=threads
+    )
+
+
+def _transcribe_part(audio_part, offset, batch_size):
+    result = _worker_model.transcribe(audio_part, batch_size=batch_size)
+    for segment in result["segments"]:
+        segment["start"] += offset
+        segment["end"] += offset
+    return result
+
+
+def resolve_device(device: str = "auto"):
+    if device == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    return device
+
+
 class WhisperXTranscriber:
     def __init__(self):
-        self.model_name = config.transcript.whisperx.model_name
-        self.model = None
-        self.device = "cuda"
-        if not self.model:
+        settings = config.transcript.whisperx
+        self.model_name = settings.model_name
+        self.device = resolve_device(settings.device)
+        self.threads = settings.threads or os.cpu_count()
+        self.compute_type = self.get_compute_type(settings.compute_type)
+        self.workers = settings.parallel_workers
+        self.min_segment_s = settings.min_segment_s
+        self._pool = None
+        diarization = config.transcript.diarization
+        self.diarize = diarization.enabled
+        self.min_speakers = diarization.min_speakers
+        self.max_speakers = diarization.max_speakers
+        self.concurrent = diarization.concurrent
+        if self.device == "cpu":
+            torch.set_num_threads(self.threads)
+        logging.info(
+            f"WhisperX on {self.device} ({self.compute_type}, {self.threads} threads)"
+        )
+        if self.workers <= 1:
             self.load_model()
-        self.batch_size = 4
+        # sized after loading the model so the free memory estimate excludes it
+        self.batch_sizer = AdaptiveBatchSize(
+            "WhisperX",
+            self.get_batch_size(settings),
+            config_key="transcript.whisperx.batch_size",
+        )
+
+    def get_compute_type(self, compute_type):
+        if compute_type != "auto":
+            return compute_type
+        return "float16" if self.device.startswith("cuda") else "int8"
+
+    def get_batch_size(self, settings):
+        if settings.batch_size != "auto":
+            return int(settings.batch_size)
+        # faster-whisper spreads each batch over the intra-op threads, so larger
+        # batches only pay off on CPU once there are enough cores to feed them
+        return discover_batch_size(
+            self.device,
+            settings.batch_item_gb,
+            settings.max_batch_size,
+            cpu_default=max(1, self.threads // 8),
+        )
+
+    @property
+    def model(self):
+        return self.load_model()
 
     def load_model(self):
-        self.model = whisperx.load_model(self.model_name, self.device, language="nl")
+        return registry.get(
+            ("whisperx", self.model_name, self.device, self.compute_type),
+            lambda: whisperx.load_model(
+                self.model_name,
+                self.device,
+                compute_type=self.compute_type,
+                language="nl",
+                threads=self.threads,
+            ),
+            device=self.device,
+            size_hint_gb=size_hint("whisperx"),
+        )
+
+    def load_align_model(self):
+        return registry.get(
+            ("whisperx-align", "nl", self.device),
+            lambda: whisperx.load_align_model(language_code="nl", device=self.device),
+            device=self.device,
+            size_hint_gb=size_hint("whisperx_align"),
+        )
+
+    def load_diarize_model(self):
+        return registry.get(
+            ("whisperx-diarize", self.device),
+            lambda: whisperx.DiarizationPipeline(device=self.device),
+            device=self.device,
+            size_hint_gb=size_hint("whisperx_diarize"),
+        )
+
+    def get_pool(self):
+        if self._pool is None:
+            threads = max(1, self.threads // self.workers)
+            logging.info(
+                f"Starting {self.workers} transcription workers with {threads} threads each"
+            )
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_transcription_worker,
+                initargs=(self.model_name, self.device, self.compute_type, threads),
+            )
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def transcribe_parallel(self, audio):
+        """Transcribe audio split at pauses in separate worker processes.
+
+        The segments of all parts are shifted to absolute timestamps and
+        concatenated in order, giving the same result shape as a single
+        model.transcribe call.
+        """
+        sample_rate = whisperx.audio.SAMPLE_RATE
+        duration = len(audio) / sample_rate
+        n_parts = max(1, min(2 * self.workers, int(duration // self.min_segment_s)))
+        parts = split_on_silence(audio, n_parts, sample_rate)
+        logging.info(f"Transcribing {duration:.0f}s of audio in {len(parts)} parts")
+        results = self.get_pool().map(
+            _transcribe_part,
+            [audio[start:end] for start, end in parts],
+            [start / sample_rate for start, _ in parts],
+            [self.batch_sizer.size] * len(parts),
+        )
+        segments = []
+        language = None
+        for result in results:
+            segments.extend(result["segments"])
+            language = language or result.get("language")
+        return {"segments": segments, "language": language}
 
     def transcribe(self, interview):
-        audio = whisperx.load_audio(interview.audio_path)
-        result = self.model.transcribe(audio, batch_size=self.batch_size)
+        audio_hash = file_hash(interview.audio_path)
+        audio = None
 
-        # 2. Align whisper output
-        model_a, metadata = whisperx.load_align_model(
-            language_code="nl", device=self.device
+        # the split into parts and batches changes the segments, so it is part of the key
+        split = (self.workers, self.min_segment_s) if self.workers > 1 else 1
+        transcribe_key = stage_cache.key(
+            "transcribe",
+            audio_hash,
+            self.model_name,
+            self.compute_type,
+            "nl",
+            split,
+            # the configured value, so an "auto" size or an out of memory back-off keeps the key
+            config.transcript.whisperx.batch_size,
         )
-        result = whisperx.align(
+        result = stage_cache.get("transcribe", transcribe_key)
+        if result is None:
+            audio = whisperx.load_audio(interview.audio_path)
+            if self.workers > 1:
+                result = self.transcribe_parallel(audio)
+            else:
+                result = self.batch_sizer.run(
+                    lambda batch_size: self.model.transcribe(
+                        audio, batch_size=batch_size
+                    )
+                )
+            stage_cache.put("transcribe", transcribe_key, result)
+
+        align_key = stage_cache.key("align", transcribe_key, "nl")
+        aligned = stage_cache.get("align", align_key)
+        diarize_turns = None
+        if self.diarize:
+            diarize_key = stage_cache.key(
+                "diarize", audio_hash, self.min_speakers, self.max_speakers
+            )
+            diarize_turns = stage_cache.get("diarize", diarize_key)
+        needs_diarization = self.diarize and diarize_turns is None
+        if (aligned is None or needs_diarization) and audio is None:
+            audio = whisperx.load_audio(interview.audio_path)
+
+        # alignment and diarization only share the audio, so the diarization runs
+        # in a worker thread while the alignment runs here
+        diarize_future = None
+        if needs_diarization:
+            diarize_model = self.load_diarize_model()
+            if self.concurrent and aligned is None:
+                executor = ThreadPoolExecutor(max_workers=1)
+                diarize_future = executor.submit(self._diarize, diarize_model, audio)
+                executor.shutdown(wait=False)
+            else:
+                diarize_turns = self._diarize(diarize_model, audio)
+
+        if aligned is None:
+            aligned = self._align(result, audio)
+            stage_cache.put("align", align_key, aligned)
+        result = aligned
+
+        if diarize_future is not None:
+            diarize_turns = diarize_future.result()
+        if needs_diarization:
+            stage_cache.put("diarize", diarize_key, diarize_turns)
+
+        if self.diarize:
+            diarize_segments = pd.DataFrame(
+                diarize_turns, columns=["start", "end", "speaker"]
+            )
+            result = whisperx.assign_word_speakers(diarize_segments, result)
+        interview.transcript = Transcript(result["segments"], whisperx=True)
+
+    def _align(self, result, audio):
+        model_a, metadata = self.load_align_model()
+        return whisperx.align(
             result["segments"],
             model_a,
             metadata,
@@ -66,13 +284,17 @@ class WhisperXTranscriber:
             return_char_alignments=False,
         )
 
-        # print(result["segments"])  # after alignment
-
-        diarize_model = whisperx.DiarizationPipeline(device=self.device)
-
-        # add min/max number of speakers if known
-        diarize_segments = diarize_model(audio)
-        # diarize_model(audio, min_speakers=min_speakers, max_speakers=max_speakers)
-
-        result = whisperx.assign_word_speakers(diarize_segments, result)
-        interview.transcript = Transcript(result["segments"], whisperx=True)
+    def _diarize(self, diarize_model, audio):
+        if self.device.startswith("cuda"):
+            # separate stream so the kernels can overlap with the alignment
+            stream = torch.cuda.Stream()
+            with torch.cuda.stream(stream):
+                diarize_segments = diarize_model(
+                    audio, min_speakers=self.min_speakers, max_speakers=self.max_speakers
+                )
+            stream.synchronize()
+        else:
+            diarize_segments = diarize_model(
+                audio, min_speakers=self.min_speakers, max_speakers=self.max_speakers
+            )
+        return diarize_segments[["start", "end", "speaker"]].to_dict("records")
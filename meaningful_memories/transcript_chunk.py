@@ -1,8 +1,40 @@
+def chunk_id(index: int) -> str:
+    """String id of a chunk, as used in the JSON output and LLM prompts."""
+    return f"id_transcription_{index}"
+
+
+def chunk_index(chunk_id: str) -> int:
+    return int(str(chunk_id).rsplit("_", 1)[-1])
+
+
 class TranscriptChunk:
-    def __init__(self, chunk_text, chunk_index, start_timestamp, end_timestamp):
-        self.id = f"id_transcription_{chunk_index}"
-        self.timestamp = (start_timestamp, end_timestamp)
+    __slots__ = ("index", "start", "end", "text", "speaker", "overlap")
+
+    def __init__(
+        self,
+        chunk_text,
+        chunk_index,
+        start_timestamp,
+        end_timestamp,
+        speaker=None,
+        overlap=0,
+    ):
+        # position in the transcript; the string id is derived from it
+        self.index = chunk_index
+        self.start = start_timestamp
+        self.end = end_timestamp
         self.text = chunk_text
+        self.speaker = speaker
+        # number of leading characters repeated from the previous chunk
+        self.overlap = overlap
+
+    @property
+    def id(self):
+        return chunk_id(self.index)
+
+    @property
+    def timestamp(self):
+        return (self.start, self.end)
 
     def id_equals(self, index):
-        return self.id.split("_")[-1] == index
+        return self.index == int(index)
@@ -0,0 +1,166 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LINE_END = re.compile(r"(?<=[.!?])\s+|\n")
+
+
+class TranscriptIndex:
+    """Maps character offsets in the combined transcript to chunks, lines and timestamps.
+
+    The combined transcript joins the chunks with a separator, leaving out
+    the overlap each chunk repeats from the previous one. The start offsets
+    of chunks and lines are kept in sorted lists, so any offset is located
+    with a binary search. Lines are the sentences of the combined text.
+    """
+
+    def __init__(self, chunks: List[Dict], separator: str = "\n"):
+        self.separator = separator
+        self.chunk_ids = []
+        self.chunk_starts = []
+        self.chunk_offsets = []
+        self.timestamps = []
+        self.speakers = []
+        parts = []
+        offset = 0
+        for chunk in chunks:
+            overlap = chunk.get("overlap") or 0
+            # the overlap was already added with the previous chunk; its local
+            # offsets map onto that copy
+            self.chunk_offsets.append(offset - overlap)
+            self.chunk_ids.append(chunk["id"])
+            self.chunk_starts.append(offset)
+            self.timestamps.append(chunk.get("timestamp"))
+            self.speakers.append(chunk.get("speaker"))
+            text = chunk["text"][overlap:]
+            parts.append(text + separator)
+            offset += len(text) + len(separator)
+        self.text = "".join(parts)
+
+        self.line_starts = [0]
+        for match in LINE_END.finditer(self.text):
+            if match.end() < len(self.text):
+                self.line_starts.append(match.end())
+        self.line_chunks = [self.chunk_position(start) for start in self.line_starts]
+
+    @classmethod
+    def from_chunks(cls, chunks, separator: str = "\n"):
+        """Index TranscriptChunk objects."""
+        return cls(
+            [
+                {
+                    "id": chunk.id,
+                    "text": chunk.text,
+                    "timestamp": chunk.timestamp,
+                    "speaker": chunk.speaker,
+                    "overlap": chunk.overlap,
+                }
+                for chunk in chunks
+            ],
+            separator,
+        )
+
+    def global_offset(self, chunk: int, local_offset: int):
+        """Offset in the combined text of a character of the chunk at position chunk."""
+        return self.chunk_offsets[chunk] + local_offset
+
+    def chunk_position(self, offset: int) -> Optional[int]:
+        if not 0 <= offset < len(self.text):
+            return None
+        return bisect_right(self.chunk_starts, offset) - 1
+
+    def line_position(self, offset: int) -> Optional[int]:
+        if not 0 <= offset < len(self.text):
+            return None
+        return bisect_right(self.line_starts, offset) - 1
+
+    def line_text(self, line: int):
+        end = (
+            self.line_starts[line + 1]
+            if line + 1 < len(self.line_starts)
+            else len(self.text)
+        )
+        return self.text[self.line_starts[line] : end].strip()
+
+    def locate(self, offset: int) -> Dict:
+        """Chunk, speaker, timestamp and line of the character at offset (None values outside the text)."""
+        chunk = self.chunk_position(offset)
+        line = self.line_position(offset)
+        if chunk is None:
+            return {
+                "chunk_id": None,
+                "timestamp": None,
+                "speaker": None,
+                "line_index": None,
+                "line_timestamp": None,
+                "line_text": None,
+            }
+        return {
+            "chunk_id": self.chunk_ids[chunk],
+            "timestamp": self.timestamps[chunk],
+            "speaker": self.speakers[chunk],
+            "line_index": line,
+            "line_timestamp": self.timestamps[self.line_chunks[line]],
+            "line_text": self.line_text(line),
+        }
+
+
+def parse_time(value) -> float:
+    """Seconds from a number or an "ss", "mm:ss" or "hh:mm:ss" string."""
+    if isinstance(value, str):
+        seconds = 0.0
+        for part in value.split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    return float(value)
+
+
+class WordTimeIndex:
+    """Start and end times of the aligned words, with their offsets in the combined transcript.
+
+    Kept as parallel arrays, sorted by time and by offset, so both a time
+    range and a character range resolve with a binary search.
+    """
+
+    def __init__(self, text: str, words: Iterable[Dict]):
+        self.starts = array("d")
+        self.ends = array("d")
+        self.char_starts = array("q")
+        self.char_ends = array("q")
+        cursor = 0
+        for word in words:
+            if word.get("start") is None or word.get("end") is None:
+                continue
+            token = word["word"].strip()
+            position = text.find(token, cursor) if token else -1
+            # a word that is not near the cursor was cut from the text (e.g. in an overlap)
+            if position < 0 or position > cursor + len(token) + 100:
+                continue
+            # kept non-decreasing, so both arrays can be searched
+            start = max(float(word["start"]), self.starts[-1] if self.starts else 0.0)
+            end = max(float(word["end"]), start, self.ends[-1] if self.ends else 0.0)
+            self.starts.append(start)
+            self.ends.append(end)
+            self.char_starts.append(position)
+            self.char_ends.append(position + len(token))
+            cursor = position + len(token)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def time_span(self, char_start: int, char_end: int) -> Optional[Tuple[float, float]]:
+        """(start, end) in seconds of the words overlapping a character range."""
+        first = bisect_right(self.char_ends, char_start)
+        last = bisect_left(self.char_starts, char_end) - 1
+        if first > last:
+            return None
+        return self.starts[first], self.ends[last]
+
+    def char_span(self, time_start: float, time_end: float) -> Optional[Tuple[int, int]]:
+        """Character range of the words spoken between time_start and time_end."""
+        first = bisect_right(self.ends, time_start)
+        last = bisect_left(self.starts, time_end) - 1
+        if first > last:
+            return None
+        return self.char_starts[first], self.char_ends[last]
@@ -1,13 +1,18 @@
 import html
 import json
+import logging
 import os
+import re
+import subprocess
+import tempfile
+import wave
+from collections import defaultdict
 
 import librosa
 import soundfile as sf
 from pydub import AudioSegment
-from meaningful_memories import here
-import csv
-from collections import defaultdict
+from meaningful_memories.config import config
+from meaningful_memories.gazetteer import get_gazetteer
 
 
 def get_cache_kwargs():
@@ -29,9 +34,184 @@ def color_entities_html(text: str, label: str = "", link: str = ""):
         return f'<span style="{style} padding: 5px; border-radius: 3px;">{text}</span>'
 
 
+# line breaks after sentence-ending punctuation, within and at the end of a chunk
+SENTENCE_BREAK = re.compile(r"(?<=[a-zA-Z0-9])([.!?])(\s)")
+FINAL_SENTENCE_BREAK = re.compile(r"(?<=[a-zA-Z0-9])([.!?])(\s|$)")
+
+
+def render_chunk_html(chunk, entities, start=None, stop=None):
+    """Yield the HTML pieces of a chunk, with entities marked in one pass.
+
+    entities are (start, end, entity) tuples sorted by start, in the chunk's
+    offsets; only text[start:stop] is rendered (by default, all but the overlap).
+    """
+    text = chunk.text
+    cursor = chunk.overlap if start is None else start
+    stop = len(text) if stop is None else stop
+    pieces = []
+    for ent_start, ent_end, ent in entities:
+        if ent_start < cursor or ent_end > stop:
+            # overlaps an entity that was already marked, or lies outside the rendered text
+            continue
+        pieces.append((text[cursor:ent_start], False))
+        link = ent.get("adamlink", "")
+        if not link:
+            link = ent.get("gtaa_subject", "")
+        pieces.append(
+            (color_entities_html(text[ent_start:ent_end], ent["label"], link), True)
+        )
+        cursor = ent_end
+    pieces.append((text[cursor:stop], False))
+    for i, (piece, marked) in enumerate(pieces):
+        if marked:
+            yield SENTENCE_BREAK.sub(r"\1<br>\2", piece)
+        elif i == len(pieces) - 1:
+            yield FINAL_SENTENCE_BREAK.sub(r"\1<br>\2", piece)
+        else:
+            yield SENTENCE_BREAK.sub(r"\1<br>\2", piece)
+
+
+def chunk_boundaries(chunks, by_chunk):
+    """Where each chunk's rendering starts and stops, in its own offsets.
+
+    The overlap of a chunk is normally rendered as the end of the previous
+    chunk. When the chunk owns an entity that starts in its overlap (one
+    deduplicate_overlap kept, e.g. because it runs past the end of the previous
+    chunk), the boundary moves back to that entity, so it is rendered whole
+    from the chunk that found it. Entities of the previous chunk past the new
+    boundary move along to the chunk, in its offsets.
+    """
+    starts = [chunk.overlap for chunk in chunks]
+    stops = [len(chunk.text) for chunk in chunks]
+    for i in range(1, len(chunks)):
+        prev, chunk = chunks[i - 1], chunks[i]
+        owned = [start for start, _, _ in by_chunk[chunk.index] if start < chunk.overlap]
+        if not owned:
+            continue
+        shift = len(prev.text) + 1 - chunk.overlap
+        cut = min(owned) + shift
+        for start, end, _ in by_chunk[prev.index]:
+            if start < cut < end:
+                cut = end
+        if not starts[i - 1] <= cut < len(prev.text):
+            continue
+        stops[i - 1] = cut
+        starts[i] = cut - shift
+        moved = [
+            (start - shift, end - shift, ent)
+            for start, end, ent in by_chunk[prev.index]
+            if start >= cut
+        ]
+        # the chunk's own entities first, so they win ties with the moved ones
+        by_chunk[chunk.index] = sorted(
+            by_chunk[chunk.index] + moved, key=lambda item: item[0]
+        )
+    return starts, stops
+
+
+def write_tagged_html(path, chunks, entities, topics, score_threshold=0.8):
+    """Write the transcript with its entities marked, chunk by chunk.
+
+    Entities are grouped by chunk once and rendered from the chunk that
+    found them (see chunk_boundaries); entities without a chunk are skipped.
+    """
+    by_chunk = defaultdict(list)
+    for ent in entities:
+        if ent["score"] > score_threshold and ent.get("chunk_index") is not None:
+            by_chunk[ent["chunk_index"]].append((ent["start"], ent["end"], ent))
+    for chunk_entities in by_chunk.values():
+        chunk_entities.sort(key=lambda item: item[0])
+    starts, stops = chunk_boundaries(chunks, by_chunk)
+    with open(path, "w") as f:
+        f.write(
+            "<!DOCTYPE html>\n<html>\n<head><meta charset='UTF-8' name='viewport' content='width=device-width, initial-scale=1'>>\n</head>\n<body>\n"
+        )
+        for chunk, start, stop in zip(chunks, starts, stops):
+            f.writelines(render_chunk_html(chunk, by_chunk[chunk.index], start, stop))
+        topic_items = "".join(["<li>" + topic[0] + "</li>" for topic in topics])
+        f.write(f"<br><br> Topics: <ul>{topic_items}</ul>")
+        f.write("\n</body>\n</html>")
+
+
 def extract_audio_from_video(input_path, output_path):
-    audio, sr = librosa.load(str(input_path))
-    sf.write(os.path.join(output_path), audio, sr)
+    if config.audio.extraction_mode == "stream":
+        stream_audio_from_video(input_path, output_path)
+    else:
+        audio, sr = librosa.load(str(input_path))
+        sf.write(os.path.join(output_path), audio, sr)
+
+
+def audio_is_up_to_date(input_path, output_path, sample_rate):
+    """Check whether output_path is a mono WAV at sample_rate that is newer than input_path."""
+    if not os.path.exists(output_path):
+        return False
+    if os.path.getmtime(output_path) < os.path.getmtime(input_path):
+        return False
+    try:
+        with wave.open(str(output_path), "rb") as wav:
+            return (
+                wav.getnchannels() == 1
+                and wav.getframerate() == sample_rate
+                and wav.getnframes() > 0
+            )
+    except (wave.Error, EOFError):
+        return False
+
+
+def stream_audio_from_video(input_path, output_path):
+    """Decode the audio track with ffmpeg and write it as 16-bit mono PCM in fixed-size blocks.
+
+    Memory use is bounded by the block size, independent of the length of the recording.
+    The resulting WAV is already at the sample rate whisperx works with, so loading it
+    later does not need another resampling pass.
+    """
+    sample_rate = config.audio.sample_rate
+    if audio_is_up_to_date(input_path, output_path, sample_rate):
+        logging.info(f"Skipping conversion, {output_path} is up to date.")
+        return
+
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel",
+        "error",
+        "-i",
+        str(input_path),
+        "-vn",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "-acodec",
+        "pcm_s16le",
+        "-f",
+        "s16le",
+        "-",
+    ]
+    tmp_path = f"{output_path}.part"
+    # stderr goes to a file: a pipe that is only read after stdout could fill
+    # up and block ffmpeg
+    with tempfile.TemporaryFile() as errors, subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=errors
+    ) as process:
+        with wave.open(tmp_path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            while True:
+                block = process.stdout.read(config.audio.block_size)
+                if not block:
+                    break
+                wav.writeframesraw(block)
+        process.wait()
+        errors.seek(0)
+        stderr = errors.read()
+    if process.returncode != 0:
+        os.remove(tmp_path)
+        raise RuntimeError(
+            f"ffmpeg failed to extract audio from {input_path}: {stderr.decode(errors='replace')}"
+        )
+    os.replace(tmp_path, output_path)
 
 
 def create_small_sample(input_path, out_dir, start=10000, end=300000):
@@ -59,12 +239,14 @@ def read_json(input_path):
 
 
 def get_adamlink_coordinates(uri):
-    loc_data = defaultdict(list)
-    path = os.path.join(here, "data/adamlink_streets_buildings.csv")
-    with open(path, mode="r", newline="") as file:
-        reader = csv.DictReader(file, delimiter=",")
-        for row in reader:
-            loc_data[row["adamlink_uri"]] = row
-    if loc_data[uri]:
-        return loc_data[uri]["longitude"], loc_data[uri]["latitude"]
-    return 0,0
+    return get_adamlink_coordinates_many([uri])[uri]
+
+
+def get_adamlink_coordinates_many(uris):
+    """Map each AdamLink URI to its (longitude, latitude), (0, 0) when unknown."""
+    uris = list(dict.fromkeys(uris))
+    coordinates = get_gazetteer().coordinates(uris)
+    return {
+        uri: point if point is not None else (0, 0)
+        for uri, point in zip(uris, coordinates)
+    }
@@ -0,0 +1,46 @@
+import json
+import os
+
+from meaningful_memories.annotation_utils import (VideoCatalogue,
+                                                  generate_web_annotations)
+
+
+def test_video_catalogue_follows_file(tmp_path):
+    path = tmp_path / "videos.json"
+    videos = [
+        {"@id": "https://example.org/1", "name": "Eerste", "identifier": "interview_a.mp4"},
+        {"@id": "https://example.org/2", "name": "Dubbel", "identifier": "interview_a.mov"},
+    ]
+    path.write_text(json.dumps(videos), encoding="utf-8")
+    catalogue = VideoCatalogue(str(path))
+    assert catalogue.look_up_many(["interview_a", "missing"]) == {
+        "interview_a": ("Eerste", "interview_a.mp4", "https://example.org/1"),
+        "missing": ("", "", ""),
+    }
+
+    videos.append({"@id": "https://example.org/3", "name": "Nieuw", "identifier": "interview_b.mp4"})
+    path.write_text(json.dumps(videos), encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+    assert catalogue.look_up("interview_b") == ("Nieuw", "interview_b.mp4", "https://example.org/3")
+
+
+def test_entity_without_timestamp_keeps_text_selector():
+    text = "Ik woonde in de Jordaan."
+    data = {
+        "entities": [
+            {"label": "Location", "global_start": 16, "global_end": 23, "timestamps": [1.0, 2.5]},
+            # added in Label Studio, past the transcript chunks
+            {"label": "Location", "global_start": 16, "global_end": 23},
+        ],
+        "transcript_chunks": [],
+        "data": {"text": text},
+        "topics_aggregate": [],
+    }
+    timed, untimed = generate_web_annotations(data, "interview_x")
+    assert [s["type"] for s in timed["target"]["selector"]] == [
+        "TextQuoteSelector",
+        "FragmentSelector",
+    ]
+    assert timed["target"]["selector"][1]["values"] == "t=1.0,2.5"
+    assert [s["type"] for s in untimed["target"]["selector"]] == ["TextQuoteSelector"]
+    assert untimed["target"]["selector"][0]["exact"] == "Jordaan"
@@ -0,0 +1,39 @@
+import pytest
+
+from meaningful_memories.batching import AdaptiveBatchSize
+
+
+def test_batch_size_halves_on_out_of_memory():
+    sizes = []
+
+    def double(batch):
+        sizes.append(len(batch))
+        if len(batch) > 2:
+            raise RuntimeError("CUDA out of memory")
+        return [item * 2 for item in batch]
+
+    batch_sizer = AdaptiveBatchSize("test", 8)
+    assert batch_sizer.map(double, list(range(7))) == [i * 2 for i in range(7)]
+    assert batch_sizer.size == 2
+    assert sizes[:3] == [7, 4, 2]
+
+
+def test_other_errors_are_raised():
+    def fail(batch_size):
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        AdaptiveBatchSize("test", 4).run(fail)
+
+
+def test_sorted_batches_keep_the_input_order():
+    batches = []
+
+    def upper(batch):
+        batches.append(batch)
+        return [text.upper() for text in batch]
+
+    texts = ["ccc", "a", "bbbb", "dd", "e"]
+    batch_sizer = AdaptiveBatchSize("test", 2)
+    assert batch_sizer.map_sorted(upper, texts, key=len) == ["CCC", "A", "BBBB", "DD", "E"]
+    assert batches == [["a", "e"], ["dd", "ccc"], ["bbbb"]]
@@ -0,0 +1,42 @@
+from meaningful_memories.cache import ResponseCache, StageCache, file_hash
+
+
+def test_stage_cache_roundtrip(tmp_path):
+    cache = StageCache(cache_dir=str(tmp_path))
+    key = cache.key("transcribe", "abc", "large-v3")
+    assert cache.get("transcribe", key) is None
+    cache.put("transcribe", key, {"segments": [{"start": 0.0, "end": 1.5}]})
+    assert cache.get("transcribe", key) == {"segments": [{"start": 0.0, "end": 1.5}]}
+    assert key != cache.key("transcribe", "abc", "medium")
+
+
+def test_file_hash_follows_content(tmp_path):
+    path = tmp_path / "interview.wav"
+    path.write_bytes(b"first")
+    first = file_hash(str(path))
+    path.write_bytes(b"second!")
+    assert file_hash(str(path)) != first
+
+
+def test_response_cache_evicts_least_recently_read(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "llm.sqlite"), max_entries=2)
+    first = cache.key({"model": "m", "messages": [{"role": "user", "content": "a"}]})
+    second = cache.key({"model": "m", "messages": [{"role": "user", "content": "b"}]})
+    third = cache.key({"model": "m", "messages": [{"role": "user", "content": "c"}]})
+    cache.put(first, "x")
+    cache.put(second, "y")
+    assert cache.get(first) == "x"
+    cache.put(third, "z")
+    assert cache.get(second) is None
+    assert cache.get(first) == "x" and cache.get(third) == "z"
+    assert cache.stats() == {"hits": 3, "misses": 1, "entries": 2}
+
+
+def test_response_cache_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_entries=10, ttl=60)
+    cache.put("a", "first")
+    assert cache.get("a") == "first"
+    cache.connection.execute("UPDATE responses SET created = created - 120")
+    assert cache.get("a") is None
+    cache.put("a", "second")
+    assert cache.get("a") == "second"
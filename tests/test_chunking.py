@@ -0,0 +1,52 @@
+from meaningful_memories.chunking import (DurationChunker, SpeakerTurnChunker,
+                                          TokenChunker, WordChunker,
+                                          deduplicate_overlap)
+from meaningful_memories.registry import registry
+
+units = [
+    {"text": f" woord{i} twee.", "start": i, "end": i + 1, "speaker": "A" if i < 5 else "B"}
+    for i in range(10)
+]
+
+
+def test_word_budget():
+    chunks = WordChunker(6).chunk(units)
+    assert all(len(chunk.text.split()) <= 6 for chunk in chunks)
+    assert " ".join(chunk.text for chunk in chunks).split() == " ".join(
+        unit["text"] for unit in units
+    ).split()
+
+
+def test_duration_budget():
+    chunks = DurationChunker(3).chunk(units)
+    assert [chunk.timestamp for chunk in chunks] == [(0, 3), (3, 6), (6, 9), (9, 10)]
+
+
+def test_speaker_turns():
+    chunks = SpeakerTurnChunker(100).chunk(units)
+    assert [chunk.speaker for chunk in chunks] == ["A", "B"]
+
+
+def test_overlap_entities_are_deduplicated():
+    chunks = WordChunker(6, overlap=1).chunk(units)
+    assert chunks[1].text.startswith("woord2 twee.")
+    assert chunks[1].overlap == len("woord2 twee. ")
+    entities = [
+        {"chunk_id": chunks[0].id, "start": 26, "end": 32, "label": "Location"},
+        {"chunk_id": chunks[1].id, "start": 0, "end": 6, "label": "Location"},
+    ]
+    assert deduplicate_overlap(entities, chunks) == entities[:1]
+
+
+class WhitespaceTokenizer:
+    def tokenize(self, text):
+        return text.split()
+
+
+def test_tokenizer_is_looked_up_once_per_chunking():
+    key = ("tokenizer", "whitespace-test")
+    registry.get(key, WhitespaceTokenizer)
+    chunks = TokenChunker(4, tokenizer_name="whitespace-test").chunk(units)
+    assert [chunk.text for chunk in chunks[:2]] == ["woord0 twee. woord1 twee.", "woord2 twee. woord3 twee."]
+    assert registry.stats()[str(key)]["hits"] == 1
+    registry.evict(key)
@@ -0,0 +1,65 @@
+from meaningful_memories.gazetteer import Gazetteer, normalize_label, wkt_centroid
+
+
+def test_wkt_centroid():
+    assert wkt_centroid("POINT(4.9 52.37)") == (4.9, 52.37)
+    x, y = wkt_centroid("POLYGON((0 0,2 0,2 2,0 2,0 0))")
+    assert (x, y) == (1.0, 1.0)
+    # the larger square dominates the area-weighted centroid
+    x, y = wkt_centroid(
+        "MULTIPOLYGON(((0 0,1 0,1 1,0 1,0 0)),((10 0,13 0,13 3,10 3,10 0)))"
+    )
+    assert 10 < x < 11.5 and 1 < y < 1.5
+
+
+def write_sources(tmp_path):
+    streets = tmp_path / "streets.csv"
+    streets.write_text(
+        "adamlink_uri;preflabel;wikidata;bag_uri;since_min;since_max;until_min;until_max\n"
+        "https://adamlink.nl/geo/street/damrak/1;Damrak;Q1;;1600;1600;0;0\n",
+        encoding="utf-8",
+    )
+    buildings = tmp_path / "buildings.ttl"
+    buildings.write_text(
+        "<https://adamlink.nl/geo/building/paleis/2>\n"
+        '  skos:prefLabel "Paleis op de Dam" ;\n'
+        '  skos:altLabel "Stadhuis", "Koninklijk Paléis" ;\n'
+        "  owl:sameAs <http://www.wikidata.org/entity/Q2> ;\n"
+        '  geo:hasGeometry [ geo:asWKT "POINT(4.89 52.37)" ] ;\n'
+        '  sem:hasEarliestBeginTimeStamp "1648"^^xsd:gYear .\n',
+        encoding="utf-8",
+    )
+    return str(streets), str(buildings)
+
+
+def test_build_and_lookup(tmp_path):
+    directory = tmp_path / "gazetteer"
+    Gazetteer.build(str(directory), *write_sources(tmp_path))
+    gazetteer = Gazetteer(str(directory))
+    assert len(gazetteer) == 2
+    assert gazetteer.find("DAMRAK") == [0]
+    assert gazetteer.find(normalize_label("koninklijk paleis")) == [1]
+    assert gazetteer.find_exact("Koninklijk Paléis") == 1
+    assert gazetteer.find_exact("DAMRAK") is None
+    record = gazetteer.record(1)
+    assert record["wikidata"] == "http://www.wikidata.org/entity/Q2"
+    assert record["since"] == 1648
+    assert (record["longitude"], record["latitude"]) == (4.89, 52.37)
+    assert ("Stadhuis", 1) in gazetteer.labels()
+    assert gazetteer.coordinates(
+        ["https://adamlink.nl/geo/building/paleis/2", "https://adamlink.nl/geo/street/damrak/1", "x"]
+    ) == [(4.89, 52.37), None, None]
+
+
+def test_rebuild_replaces_outdated_gazetteer(tmp_path):
+    directory = tmp_path / "gazetteer"
+    Gazetteer.build(str(directory), *write_sources(tmp_path))
+    outdated = Gazetteer(str(directory))
+    streets, buildings = write_sources(tmp_path)
+    with open(streets, "a", encoding="utf-8") as f:
+        f.write("https://adamlink.nl/geo/street/rokin/3;Rokin;Q3;;1600;1600;0;0\n")
+    Gazetteer.build(str(directory), streets, buildings)
+    assert len(Gazetteer(str(directory))) == 3
+    # the old mapping stays readable, and nothing is left next to the new one
+    assert outdated.record(0)["preflabel"] == "Damrak"
+    assert [path.name for path in tmp_path.iterdir() if path.is_dir()] == ["gazetteer"]
@@ -1,6 +1,14 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
 import pytest
+from rapidfuzz import process
 
-from meaningful_memories.linker import LocationLinker, SubjectLinker
+from meaningful_memories.config import config
+from meaningful_memories.gazetteer import Gazetteer
+from meaningful_memories.linker import (LabelIndex, LocationLinker,
+                                        SubjectLinker, link_entities)
 
 building_examples = [
     ("Paleis op de Dam", True),
@@ -33,3 +41,121 @@ def test_thesauri_lookup():
     uris = linker.find_subject_matches("brood")
     print(uris)
 
+
+def test_label_index_matches_full_scan():
+    labels = ["Warmoesstraat", "Warmoesstraat Oost", "Dam", "Damrak", "Jordaan", "Nieuwmarkt"]
+    queries = ["Warmoesstraat", "Warmoestraat", "Damrak", "Jordan", "Nieuwmarkt Plein", "Straat", ""]
+    expected = [
+        match[0] if (match := process.extractOne(query, labels, score_cutoff=95)) else None
+        for query in queries
+    ]
+    assert LabelIndex(labels).extract_many(queries, 95) == expected
+
+
+@pytest.mark.parametrize("fuzzy", [False, True])
+def test_location_linker_looks_up_gazetteer(tmp_path, monkeypatch, fuzzy):
+    streets = tmp_path / "streets.csv"
+    streets.write_text(
+        "adamlink_uri;preflabel;wikidata;bag_uri;since_min;since_max;until_min;until_max\n"
+        "https://adamlink.nl/geo/street/damrak/1;Damrak;Q1;;1600;1600;0;0\n"
+        "https://adamlink.nl/geo/street/warmoesstraat/2;Warmoesstraat;Q2;;1600;1600;0;0\n",
+        encoding="utf-8",
+    )
+    buildings = tmp_path / "buildings.ttl"
+    buildings.write_text("", encoding="utf-8")
+    directory = tmp_path / "gazetteer"
+    Gazetteer.build(str(directory), str(streets), str(buildings))
+    monkeypatch.setattr(config.gazetteer, "path", str(directory))
+    monkeypatch.setattr(config.entities, "fuzzy_search_locations", fuzzy)
+    linker = LocationLinker()
+    matches = linker.find_location_matches(["damrak", "Warmoestraat", "Nederland"])
+    assert matches[0][:3] == ("Damrak", "Q1", "https://adamlink.nl/geo/street/damrak/1")
+    assert bool(matches[1][0]) == fuzzy
+    assert matches[2] == ("", "", "", "", "")
+
+
+@pytest.fixture
+def thesaurus_endpoint(tmp_path, monkeypatch):
+    """A local stand-in for the Termennetwerk GraphQL API; yields its URL and the queries it received."""
+    queries = []
+
+    class StandIn(BaseHTTPRequestHandler):
+        def do_POST(self):
+            query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["query"]
+            queries.append(query)
+            term = "brood" if '"brood"' in query else "kaas"
+            reply = {
+                "data": {
+                    "terms": [
+                        {"result": {"__typename": "Terms", "terms": [{"uri": f"gtaa:{term}"}]}},
+                        {"result": {"__typename": "Terms", "terms": [{"uri": f"gtaa:{term}-2"}]}},
+                    ]
+                }
+            }
+            if '"fout"' in query:
+                reply = {"data": None, "errors": [{"message": "Source unavailable"}]}
+            body = json.dumps(reply).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(config.cache, "dir", str(tmp_path))
+    yield f"http://127.0.0.1:{server.server_port}/graphql", queries
+    server.shutdown()
+
+
+def test_subject_linker_batches_and_caches(thesaurus_endpoint):
+    endpoint, queries = thesaurus_endpoint
+    linker = SubjectLinker(graphql_uri=endpoint)
+    matches = linker.find_subject_matches_many(["brood", "kaas", "brood"])
+    assert matches == {"brood": ["gtaa:brood", "gtaa:brood-2"], "kaas": ["gtaa:kaas", "gtaa:kaas-2"]}
+    # one request per distinct label, covering all thesauri
+    assert len(queries) == 2
+    assert all(json.dumps(config.thesauri.uris) in query for query in queries)
+    assert SubjectLinker(graphql_uri=endpoint).find_subject_matches("kaas") == matches["kaas"]
+    assert len(queries) == 2
+
+
+def test_subject_linker_does_not_cache_graphql_errors(thesaurus_endpoint):
+    endpoint, queries = thesaurus_endpoint
+    assert SubjectLinker(graphql_uri=endpoint).find_subject_matches("fout") == []
+    assert SubjectLinker(graphql_uri=endpoint).find_subject_matches("fout") == []
+    # asked again, rather than answered from the cache
+    assert len(queries) == 2
+
+
+class StandInLocationLinker:
+    def __init__(self):
+        self.calls = []
+
+    def find_location_matches(self, locations):
+        self.calls.append(list(locations))
+        return [(location, "", f"adamlink:{location}", None, None) for location in locations]
+
+
+def test_link_entities_links_each_distinct_mention_once(thesaurus_endpoint):
+    endpoint, queries = thesaurus_endpoint
+    entities = [
+        {"text": "Jordaan", "label": "Location"},
+        {"text": "jordaan", "label": "Location"},
+        {"text": "brood", "label": "Food"},
+        {"text": "Brood ", "label": "Food"},
+        {"text": "kaas", "label": "Food"},
+        {"text": "Jan", "label": "Person"},
+    ]
+    location_linker = StandInLocationLinker()
+    link_entities(entities, location_linker, SubjectLinker(graphql_uri=endpoint, use_cache=False))
+    assert location_linker.calls == [["Jordaan"]]
+    assert entities[1]["adamlink"] == entities[0]["adamlink"] == "adamlink:Jordaan"
+    # one thesaurus request per distinct subject, copied to every mention
+    assert len(queries) == 2
+    assert entities[2]["gtaa_subject"] == entities[3]["gtaa_subject"] == ["gtaa:brood", "gtaa:brood-2"]
+    assert entities[2]["gtaa_subject"] is not entities[3]["gtaa_subject"]
+    assert entities[4]["gtaa_subject"] == ["gtaa:kaas", "gtaa:kaas-2"]
+    assert "gtaa_subject" not in entities[5] and "adamlink" not in entities[5]
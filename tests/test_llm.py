@@ -0,0 +1,162 @@
+import json
+import re
+from collections import defaultdict
+from types import SimpleNamespace
+
+from ollama import ResponseError
+
+from meaningful_memories import llm
+from meaningful_memories.cache import ResponseCache
+from meaningful_memories.config import config
+from meaningful_memories.extracter import (ChunkLocations, LLMChunkExtracter,
+                                           LLMLocationExtracter,
+                                           LLMTopicExtracter)
+from meaningful_memories.llm import LLMRequestPool
+from meaningful_memories.transcript_chunk import TranscriptChunk
+
+
+class FakeClient:
+    """Stands in for ollama's AsyncClient: replies with the request's content, fails on "fail"."""
+
+    closed = False
+
+    def __init__(self, host=None):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        FakeClient.closed = True
+
+    async def chat(self, model, messages, **kwargs):
+        content = messages[-1]["content"]
+        if content == "fail":
+            raise ResponseError("bad request", 400)
+        return SimpleNamespace(message=SimpleNamespace(content=content))
+
+
+def request(content):
+    return {"model": "m", "messages": [{"role": "user", "content": content}]}
+
+
+def test_failed_request_keeps_the_rest_of_the_batch(monkeypatch):
+    monkeypatch.setattr(llm, "AsyncClient", FakeClient)
+    pool = LLMRequestPool(use_cache=False)
+    responses = pool.chat([request("a"), request("fail"), request("b")])
+    assert responses == ["a", None, "b"]
+    assert FakeClient.closed
+
+
+def test_reply_that_does_not_parse_is_not_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm, "AsyncClient", FakeClient)
+    monkeypatch.setattr(config.cache, "dir", str(tmp_path))
+    pool = LLMRequestPool(use_cache=True)
+    responses = pool.chat([request('{"a": 1}'), request('{"a": ')], parse=json.loads)
+    assert responses == [{"a": 1}, None]
+    assert pool.cache.get(ResponseCache.key(request('{"a": 1}'))) == '{"a": 1}'
+    assert pool.cache.get(ResponseCache.key(request('{"a": '))) is None
+
+
+LOCATION = {"location": "Jordaan", "new": False, "explanation": "genoemd"}
+
+
+class AnalysisClient(FakeClient):
+    """Answers the LLM extracters by the format they ask for.
+
+    Packed replies give each chunk its id as topic and leave out the chunks
+    in dropped; single chunk analyses give the topics of the topic extracter.
+    """
+
+    dropped = ()
+
+    async def chat(self, model, messages, format=None, **kwargs):
+        content = messages[-1]["content"]
+        properties = (format or {}).get("properties", {})
+        if "chunks" in properties:
+            chunk_ids = re.findall(r"^\[(\S+)\]$", content, re.M)
+            reply = {
+                "chunks": [
+                    {"chunk_id": chunk_id, "topics": [chunk_id], "locations": [LOCATION]}
+                    for chunk_id in chunk_ids
+                    if chunk_id not in self.dropped
+                ]
+            }
+        elif "topics" in properties:
+            reply = {"topics": ["bakkerij", " brood"], "locations": [LOCATION]}
+        elif "locations" in properties:
+            reply = {"locations": [LOCATION]}
+        else:
+            return SimpleNamespace(message=SimpleNamespace(content="bakkerij, brood"))
+        return SimpleNamespace(message=SimpleNamespace(content=json.dumps(reply)))
+
+
+def interview_with_chunks(count):
+    chunks = [
+        TranscriptChunk(f"Ik woonde in straat {i}.", i, i, i + 1) for i in range(count)
+    ]
+    return SimpleNamespace(
+        transcript=SimpleNamespace(chunks=chunks),
+        entities=[],
+        chunk_topics=[],
+        chunk_locations=[],
+    )
+
+
+def test_packed_chunks_fit_the_context_and_split_back(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm, "AsyncClient", AnalysisClient)
+    monkeypatch.setattr(AnalysisClient, "dropped", ("id_transcription_2",))
+    monkeypatch.setattr(config.cache, "dir", str(tmp_path))
+    monkeypatch.setattr(config.topics, "pack_chunks", True)
+    extracter = LLMChunkExtracter(LLMRequestPool(use_cache=True))
+    interview = interview_with_chunks(5)
+    # room for the instructions and two chunks per request
+    instructions = sum(
+        extracter.estimate_tokens(message["content"])
+        for message in extracter.get_packed_message_template()
+    )
+    fragment = extracter.format_fragment(interview.transcript.chunks[0], [])
+    extracter.context_tokens = (
+        instructions + 2 * (extracter.estimate_tokens(fragment) + extracter.response_tokens)
+    )
+    packs = extracter.pack_chunks(interview.transcript.chunks, defaultdict(list))
+    assert [[chunk.index for chunk in chunks] for chunks, _ in packs] == [[0, 1], [2, 3], [4]]
+
+    extracter.extract(interview)
+    # the reply for the pack that left out chunk 2 is rejected, its chunks asked one by one
+    assert interview.chunk_topics == [
+        {"chunk_id": "id_transcription_0", "topics": ["id_transcription_0"]},
+        {"chunk_id": "id_transcription_1", "topics": ["id_transcription_1"]},
+        {"chunk_id": "id_transcription_2", "topics": ["bakkerij", "brood"]},
+        {"chunk_id": "id_transcription_3", "topics": ["bakkerij", "brood"]},
+        {"chunk_id": "id_transcription_4", "topics": ["id_transcription_4"]},
+    ]
+    cache = extracter.pool.cache
+    assert cache.get(ResponseCache.key(packs[0][1])) is not None
+    assert cache.get(ResponseCache.key(packs[1][1])) is None
+
+
+def test_single_pass_gives_the_shape_of_the_two_extracters(monkeypatch):
+    monkeypatch.setattr(llm, "AsyncClient", AnalysisClient)
+    monkeypatch.setattr(config.topics, "pack_chunks", False)
+    pool = LLMRequestPool(use_cache=False)
+    separate = interview_with_chunks(2)
+    LLMTopicExtracter(pool).extract(separate)
+    LLMLocationExtracter(pool).extract(separate)
+    single_pass = interview_with_chunks(2)
+    LLMChunkExtracter(pool).extract(single_pass)
+
+    assert single_pass.chunk_topics == separate.chunk_topics
+    for interview in (separate, single_pass):
+        assert all(
+            isinstance(loc["locations"], ChunkLocations)
+            for loc in interview.chunk_locations
+        )
+    # as Interview.write_to_file writes them
+    assert [
+        [llm_loc.dict() for llm_loc in loc["locations"].locations]
+        for loc in single_pass.chunk_locations
+    ] == [[LOCATION], [LOCATION]]
+    assert [loc["chunk_id"] for loc in single_pass.chunk_locations] == [
+        loc["chunk_id"] for loc in separate.chunk_locations
+    ]
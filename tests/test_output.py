@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from meaningful_memories.config import config
+from meaningful_memories.output import (find_output, is_output_file, read_output,
+                                        write_output)
+from meaningful_memories.scripts.find_fragments import search_entity_in_folder
+
+document = {
+    "metadata": {"label": "jan"},
+    "entities": [{"text": "Jordaan", "label": "Location", "timestamps": (1.2, 2.5)}],
+    "transcript_raw": [{"start": 0.0, "end": 2.5, "text": " Ik woonde in de Jordaan.", "words": []}],
+    "predictions": [{"result": [{"value": {"text": "Jordaan", "labels": ["Location"]}}]}],
+}
+
+
+@pytest.fixture
+def sidecars(monkeypatch):
+    monkeypatch.setattr(config.output, "sidecars", True)
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zstd"])
+def test_output_roundtrip(tmp_path, compression, sidecars):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    base_path = str(tmp_path / "jan.json")
+    path = write_output(base_path, document, compression=compression)
+    assert find_output(base_path) == path
+    output = read_output(path)
+    # the raw segments and predictions are in sidecars, read on first access
+    assert "transcript_raw" not in output.data and "predictions" not in output.data
+    assert output["transcript_raw"] == document["transcript_raw"]
+    assert output["predictions"] == document["predictions"]
+    assert output["entities"][0]["timestamps"] == [1.2, 2.5]
+    assert sorted(output) == sorted(document)
+
+
+def test_rewriting_in_another_format_removes_the_old_files(tmp_path, sidecars):
+    base_path = str(tmp_path / "jan.json")
+    write_output(base_path, document, compression="none")
+    write_output(base_path, document, compression="gzip")
+    assert sorted(os.listdir(tmp_path)) == [
+        "jan.json.gz",
+        "jan.predictions.json.gz",
+        "jan.segments.json.gz",
+    ]
+    assert [is_output_file(name) for name in sorted(os.listdir(tmp_path))] == [True, False, False]
+
+
+def test_output_without_sidecars_is_one_document(tmp_path):
+    path = write_output(str(tmp_path / "jan.json"), document)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    output = read_output(path)
+    assert output.sidecars == {}
+    assert output.data["transcript_raw"] == document["transcript_raw"]
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zstd"])
+def test_search_skips_corrupt_files(tmp_path, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    os.mkdir(tmp_path / "jan")
+    os.mkdir(tmp_path / "piet")
+    write_output(str(tmp_path / "jan" / "jan.json"), document, compression=compression)
+    path = write_output(str(tmp_path / "piet" / "piet.json"), document, compression=compression)
+    with open(path, "r+b") as f:
+        f.truncate(20)
+    results = search_entity_in_folder(str(tmp_path), "Jordaan")
+    assert list(results) == [str(tmp_path / "jan" / os.path.basename(path).replace("piet", "jan"))]
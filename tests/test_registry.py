@@ -0,0 +1,25 @@
+from meaningful_memories.registry import GIB, ModelRegistry
+
+
+def test_model_loaded_once():
+    registry = ModelRegistry()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return object()
+
+    first = registry.get("model", loader)
+    second = registry.get("model", loader)
+    assert first is second
+    assert len(calls) == 1
+    assert registry.stats()["model"]["hits"] == 1
+
+
+def test_least_recently_used_model_is_evicted():
+    registry = ModelRegistry(cpu_budget_gb=1)
+    # the loaders allocate nothing measurable, like models with their own allocator
+    registry.get("whisper", object, size_hint_gb=0.6)
+    assert registry.stats()["whisper"]["size_bytes"] == int(0.6 * GIB)
+    registry.get("gliner", object, size_hint_gb=0.6)
+    assert list(registry.stats()) == ["gliner"]
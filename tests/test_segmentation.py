@@ -0,0 +1,23 @@
+import numpy as np
+
+from meaningful_memories.segmentation import split_on_silence
+
+SAMPLE_RATE = 16000
+
+
+def test_split_falls_in_pause():
+    rng = np.random.default_rng(0)
+    speech = rng.uniform(-0.5, 0.5, 10 * SAMPLE_RATE).astype(np.float32)
+    pause = np.zeros(2 * SAMPLE_RATE, dtype=np.float32)
+    audio = np.concatenate([speech, pause, speech[: 6 * SAMPLE_RATE]])
+
+    parts = split_on_silence(audio, 2, SAMPLE_RATE)
+
+    assert len(parts) == 2
+    assert parts[0][0] == 0 and parts[-1][1] == len(audio)
+    assert 10 * SAMPLE_RATE <= parts[0][1] <= 12 * SAMPLE_RATE
+
+
+def test_single_part():
+    audio = np.ones(SAMPLE_RATE, dtype=np.float32)
+    assert split_on_silence(audio, 1, SAMPLE_RATE) == [(0, SAMPLE_RATE)]
@@ -0,0 +1,50 @@
+from meaningful_memories.entity import Entity
+from meaningful_memories.segments import Segments
+
+whisperx_segments = [
+    {
+        "start": 0.0,
+        "end": 1.5,
+        "text": " Ik woonde in de Jordaan.",
+        "words": [
+            {"word": "Ik", "start": 0.0, "end": 0.2, "score": 0.9, "speaker": "SPEAKER_00"},
+            {"word": "1953", "score": 0.5},
+        ],
+        "speaker": "SPEAKER_00",
+    },
+    {"start": 2.0, "end": 3.0, "text": " Ja.", "words": []},
+]
+
+
+def test_segments_roundtrip():
+    for records in [
+        whisperx_segments,
+        [{"timestamp": (0.0, 2.0), "text": "Hallo"}, {"timestamp": (2.0, None), "text": "daar"}],
+        [{"text": "Beschrijving"}, {"text": "Artikel"}],
+    ]:
+        assert Segments.from_records(records).to_records() == records
+
+
+def test_segment_words():
+    segments = Segments.from_records(whisperx_segments)
+    assert list(segments.words(1)) == []
+    assert [word["word"] for word in segments.words()] == ["Ik", "1953"]
+    assert segments.times(0) == (0.0, 1.5)
+
+
+def test_entity_behaves_like_its_dict():
+    data = {"start": 3, "end": 10, "text": "Jordaan", "label": "Location", "score": 0.9,
+            "chunk_id": "id_transcription_12", "timestamps": [0.0, 20.0], "custom": 1}
+    ent = Entity.from_dict(data)
+    assert ent["chunk_index"] == 12
+    assert ent["chunk_id"] == "id_transcription_12"
+    assert ent.get("adamlink", "") == "" and "adamlink" not in ent
+    ent["adamlink"] = "https://adamlink.nl/geo/street/jordaan/1"
+    assert ent.to_dict() == dict(data, adamlink="https://adamlink.nl/geo/street/jordaan/1")
+
+
+def test_entity_without_chunk():
+    data = {"start": 0, "end": 4, "text": "Mijn", "label": "Person", "score": 0.9, "chunk_id": None}
+    ent = Entity.from_dict(data)
+    assert ent["chunk_index"] is None
+    assert ent.to_dict() == data
@@ -0,0 +1,46 @@
+import json
+
+from meaningful_memories.thesaurus import ThesaurusIndex, read_ntriples
+
+SCHEME = "http://data.beeldengeluid.nl/gtaa/Onderwerpen"
+OTHER = "http://data.beeldengeluid.nl/gtaa/Namen"
+
+
+def test_build_and_find(tmp_path):
+    triples = tmp_path / "gtaa.nt"
+    triples.write_text(
+        f'<http://data.beeldengeluid.nl/gtaa/1> <http://www.w3.org/2004/02/skos/core#inScheme> <{SCHEME}> .\n'
+        '<http://data.beeldengeluid.nl/gtaa/1> <http://www.w3.org/2004/02/skos/core#prefLabel> "brood"@nl .\n'
+        '<http://data.beeldengeluid.nl/gtaa/1> <http://www.w3.org/2004/02/skos/core#altLabel> "Br\\u00F4od"@nl .\n'
+        f'<http://data.beeldengeluid.nl/gtaa/9> <http://www.w3.org/2004/02/skos/core#inScheme> <http://example.org/other> .\n'
+        '<http://data.beeldengeluid.nl/gtaa/9> <http://www.w3.org/2004/02/skos/core#prefLabel> "brood"@nl .\n',
+        encoding="utf-8",
+    )
+    terms = tmp_path / "namen.json"
+    terms.write_text(
+        json.dumps([{"uri": "http://data.beeldengeluid.nl/gtaa/2", "prefLabel": "Brood", "hiddenLabel": ["broodje"]}]),
+        encoding="utf-8",
+    )
+    path = str(tmp_path / "index.sqlite")
+    ThesaurusIndex.build(path, [str(triples)], [SCHEME, OTHER])
+    ThesaurusIndex.build(path, [str(triples), str(terms)], [SCHEME, OTHER], default_scheme=OTHER)
+    index = ThesaurusIndex(path)
+    assert index.find_many(["Brood", "bröod", "broodje", "kaas"], [SCHEME, OTHER]) == {
+        "Brood": ["http://data.beeldengeluid.nl/gtaa/1", "http://data.beeldengeluid.nl/gtaa/2"],
+        "bröod": ["http://data.beeldengeluid.nl/gtaa/1", "http://data.beeldengeluid.nl/gtaa/2"],
+        "broodje": ["http://data.beeldengeluid.nl/gtaa/2"],
+        "kaas": [],
+    }
+    assert index.find_many(["brood"], [OTHER]) == {"brood": ["http://data.beeldengeluid.nl/gtaa/2"]}
+
+
+def test_read_ntriples_unescapes_literals(tmp_path):
+    triples = tmp_path / "escapes.nt"
+    triples.write_text(
+        '<http://example.org/1> <http://www.w3.org/2004/02/skos/core#prefLabel> '
+        '"Caf\\U000000E9 \\u00E9\\t\\"x\\" \\U0001F35E"@nl .\n',
+        encoding="utf-8",
+    )
+    assert list(read_ntriples(str(triples))) == [
+        ("http://example.org/1", "http://www.w3.org/2004/02/skos/core#prefLabel", 'Café é\t"x" 🍞')
+    ]
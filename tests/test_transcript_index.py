@@ -0,0 +1,59 @@
+from meaningful_memories.transcript import Transcript
+from meaningful_memories.transcript_index import TranscriptIndex
+
+CHUNKS = [
+    {"id": "id_transcription_0", "text": "Ik woonde in de Jordaan. Mijn vader", "timestamp": (0.0, 4.0), "speaker": "A"},
+    {"id": "id_transcription_1", "text": "Mijn vader was bakker.", "timestamp": (3.0, 6.0), "speaker": "B", "overlap": 11},
+]
+
+
+def test_offsets_follow_combined_text():
+    index = TranscriptIndex(CHUNKS)
+    assert index.text == "Ik woonde in de Jordaan. Mijn vader\nwas bakker.\n"
+    start = index.global_offset(1, CHUNKS[1]["text"].index("bakker"))
+    assert index.text[start : start + 6] == "bakker"
+    # entities in the overlap map onto the copy in the previous chunk
+    assert index.global_offset(1, 0) == index.text.index("Mijn")
+
+
+def test_locate():
+    index = TranscriptIndex(CHUNKS)
+    jordaan = index.locate(index.text.index("Jordaan"))
+    assert jordaan["chunk_id"] == "id_transcription_0"
+    assert jordaan["line_index"] == 0
+    assert jordaan["line_text"] == "Ik woonde in de Jordaan."
+    bakker = index.locate(index.text.index("bakker"))
+    assert (bakker["chunk_id"], bakker["timestamp"], bakker["speaker"]) == ("id_transcription_1", (3.0, 6.0), "B")
+    assert bakker["line_index"] == 2
+    assert index.locate(len(index.text))["chunk_id"] is None
+
+
+def test_word_times():
+    segments = [
+        {
+            "text": " Ik woonde in de Jordaan.",
+            "start": 0.0,
+            "end": 2.5,
+            "words": [
+                {"word": "Ik", "start": 0.0, "end": 0.2},
+                {"word": "woonde", "start": 0.3, "end": 0.7},
+                {"word": "in", "start": 0.8, "end": 0.9},
+                {"word": "de", "start": 1.0, "end": 1.1},
+                {"word": "Jordaan.", "start": 1.2, "end": 2.5},
+            ],
+        },
+        {
+            "text": " In 1953.",
+            "start": 3.0,
+            "end": 4.0,
+            "words": [{"word": "In", "start": 3.0, "end": 3.2}, {"word": "1953."}],
+        },
+    ]
+    transcript = Transcript(segments, whisperx=True)
+    text = transcript.index.text
+    start = text.index("Jordaan")
+    assert transcript.get_word_timestamps(start, start + 7) == (1.2, 2.5)
+    assert transcript.get_word_timestamps(text.index(" de ") + 1, start + 7) == (1.0, 2.5)
+    assert transcript.get_transcript_at_time(0.75, 1.15) == "in de"
+    assert transcript.get_transcript_at_time("00:00", "00:03.1") == "Ik woonde in de Jordaan. In"
+    assert transcript.get_transcript_at_time(10, 20) == ""
@@ -0,0 +1,48 @@
+from meaningful_memories.transcript_chunk import TranscriptChunk
+from meaningful_memories.utils import write_tagged_html
+
+
+def test_tagged_html_marks_entities_once(tmp_path):
+    chunks = [
+        TranscriptChunk("Ik woonde in de Jordaan. Mijn vader", 0, 0, 4),
+        TranscriptChunk("Mijn vader at brood.", 1, 3, 6, overlap=11),
+    ]
+    entities = [
+        {"start": 14, "end": 19, "text": "brood", "label": "Food", "score": 0.9, "chunk_index": 1},
+        {"start": 16, "end": 23, "text": "Jordaan", "label": "Location", "score": 0.9, "chunk_index": 0,
+         "adamlink": "https://adamlink.nl/geo/district/jordaan"},
+        # in the overlap, missed by the previous chunk: rendered from this one
+        {"start": 0, "end": 4, "text": "Mijn", "label": "Person", "score": 0.9, "chunk_index": 1},
+        {"start": 0, "end": 2, "text": "Ik", "label": "Person", "score": 0.5, "chunk_index": 0},
+        # merged from annotations, not in any chunk
+        {"start": 0, "end": 2, "text": "Ik", "label": "Person", "score": 0.9, "chunk_index": None},
+    ]
+    path = tmp_path / "tagged.html"
+    write_tagged_html(str(path), chunks, entities, [("bakkerij", 2)])
+    html = path.read_text()
+    assert html.count("<span") == 3
+    assert 'href="https://adamlink.nl/geo/district/jordaan"' in html
+    assert html.count("Mijn") == 1 and "Mijn</span> vader" in html
+    assert "at <span" in html and "brood</span>.<br>" in html
+    assert "<li>bakkerij</li>" in html
+
+
+def test_tagged_html_renders_entities_across_chunk_boundaries(tmp_path):
+    chunks = [
+        TranscriptChunk("We liepen over de Nieuwe", 0, 0, 4),
+        TranscriptChunk("de Nieuwe Herengracht naar huis.", 1, 3, 6, overlap=10),
+    ]
+    entities = [
+        {"start": 15, "end": 17, "text": "de", "label": "Date", "score": 0.9, "chunk_index": 0},
+        {"start": 18, "end": 24, "text": "Nieuwe", "label": "Person", "score": 0.9, "chunk_index": 0},
+        # runs past the end of the previous chunk, so only this chunk found it whole
+        {"start": 3, "end": 21, "text": "Nieuwe Herengracht", "label": "Location", "score": 0.9,
+         "chunk_index": 1},
+    ]
+    path = tmp_path / "tagged.html"
+    write_tagged_html(str(path), chunks, entities, [])
+    html = path.read_text()
+    assert html.count("<span") == 2
+    assert ">de</span> <span" in html
+    assert ">Nieuwe Herengracht</span> naar huis." in html
+    assert html.count("Nieuwe") == 1